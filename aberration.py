@@ -0,0 +1,98 @@
+import threading
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+class AberrationDetector:
+    """EARS C2 and CUSUM flags over a per-period count series, updated incrementally"""
+
+    def __init__(self, baseline=7, lag=2, c2_threshold=3.0, cusum_k=0.5, cusum_h=4.0, min_sd=0.5):
+        self.baseline = baseline
+        self.lag = lag
+        self.c2_threshold = c2_threshold
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.min_sd = min_sd
+
+        self._periods = pd.PeriodIndex([], freq='M')
+        self._counts = np.array([], dtype=float)
+        self._expected = np.array([], dtype=float)
+        self._c2 = np.array([], dtype=float)
+        self._cusum = np.array([], dtype=float)
+        self._lock = threading.Lock()
+
+    def _changed_from(self, periods, counts):
+        """First position where the new series differs from the processed one"""
+        if len(self._periods) == 0 or self._periods.freq != periods.freq:
+            return 0
+
+        common = min(len(self._periods), len(periods))
+        same = (self._periods[:common] == periods[:common]) & (self._counts[:common] == counts[:common])
+        return common if same.all() else int(np.argmin(same))
+
+    def _c2_block(self, counts, start):
+        """Baseline mean and C2 statistic for positions from start onwards"""
+        positions = np.arange(start, len(counts))
+        expected = np.full(len(positions), np.nan)
+        c2 = np.full(len(positions), np.nan)
+
+        # Each period is compared with the baseline window ending lag periods before it
+        valid = positions >= self.baseline + self.lag
+        if valid.any():
+            windows = sliding_window_view(counts, self.baseline)
+            base = windows[positions[valid] - self.lag - self.baseline]
+            mean = base.mean(axis=1)
+            sd = base.std(axis=1, ddof=1)
+            expected[valid] = mean
+            c2[valid] = (counts[positions[valid]] - mean) / np.maximum(sd, self.min_sd)
+
+        return expected, c2
+
+    def update(self, periods, counts):
+        """Bring the detector up to date with a full series, recomputing only new or changed periods"""
+        periods = pd.PeriodIndex(periods)
+        counts = np.asarray(counts, dtype=float)
+
+        with self._lock:
+            start = self._changed_from(periods, counts)
+            expected, c2 = self._c2_block(counts, start)
+
+            # CUSUM carries on from the last unchanged period and restarts after a signal
+            cusum = np.empty(len(c2))
+            level = self._cusum[start - 1] if start > 0 else 0.0
+            for i, z in enumerate(c2):
+                if level > self.cusum_h:
+                    level = 0.0
+                level = 0.0 if np.isnan(z) else max(0.0, level + z - self.cusum_k)
+                cusum[i] = level
+
+            self._periods = periods
+            self._counts = counts
+            self._expected = np.concatenate([self._expected[:start], expected])
+            self._c2 = np.concatenate([self._c2[:start], c2])
+            self._cusum = np.concatenate([self._cusum[:start], cusum])
+
+            return self.results()
+
+    def results(self):
+        """Per-period statistics and flags for the processed series"""
+        flagged = (self._c2 > self.c2_threshold) | (self._cusum > self.cusum_h)
+        return pd.DataFrame({
+            'Period': self._periods,
+            'Count': self._counts,
+            'Expected': self._expected,
+            'C2': self._c2,
+            'CUSUM': self._cusum,
+            'Flagged': flagged
+        })
+
+# Detectors live for the whole process so each data refresh only processes new periods
+_DETECTORS = {}
+_DETECTORS_LOCK = threading.Lock()
+
+def get_detector(key):
+    """Get the shared detector for a series key, creating it on first use"""
+    with _DETECTORS_LOCK:
+        if key not in _DETECTORS:
+            _DETECTORS[key] = AberrationDetector()
+        return _DETECTORS[key]
@@ -1,13 +1,200 @@
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import functools
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aberration import get_detector
+from rolling import get_rolling_sums
+
+UNDER5_COLS = [
+    'Number of contacts <5 years living with index case',
+    'Number of positive TB cases among contacts <5 years',
+    'Number of < 5 years contacts with TPT completed'
+]
+
+# Yes/No high-risk columns
+YES_NO_COLS = ['Prisoners', 'Contact of TPB+', 'Contact of MDR - TB',
+               'Diabetic (new)', 'Mining worker (new)', 'Refugee ']
+
+# Derived flag columns shared by the pandas and Polars preprocessing
+FLAG_COLUMNS = ['Is_Cured', 'Is_CuredCompleted', 'Under15', 'Above65', 'HIV_Positive',
+                'High_Risk', 'New_Case', 'Relapse_Case', 'New_or_Relapse', 'Under14']
+
+# Treatment outcome labels we expect from the surveillance system (lowercase)
+KNOWN_OUTCOMES = [
+    'cured', 'completed', 'treatment completed', 'failed', 'treatment failed',
+    'died', 'lost to follow-up', 'lost to follow up', 'not evaluated',
+    'transferred out', 'moved to mdr', 'still on treatment', 'on treatment'
+]
+
+# Period column used for each period type
+PERIOD_COLUMNS = {
+    'monthly': 'YearMonth',
+    'quarterly': 'Quarter',
+    'weekly': 'Week',
+    'daily': 'Day'
+}
+
+# Fine-grained period types drawn with WebGL traces and typed-array data
+HIGH_RESOLUTION_PERIODS = ('weekly', 'daily')
+
+# Per-period series watched for aberrations
+ABERRATION_SERIES = {
+    'New': 'New cases',
+    'Relapse': 'Relapse cases',
+    'High_Risk': 'High-risk cases'
+}
+
+# Programme targets: target value and whether higher or lower values are better
+TARGETS = {
+    'ltbi_coverage': (90, 'higher_better'),
+    'yearly_incidence': (46, 'lower_better')
+}
+
+# Values within this ratio of their target count as close to it
+TARGET_WARNING_RATIOS = {'higher_better': 0.8, 'lower_better': 1.2}
+
+# Target status codes
+TARGET_STATUS_LABELS = {-1: 'No data', 0: 'Target met', 1: 'Close to target', 2: 'Target missed'}
+
+# Months per period, for annualizing per-period incidence
+PERIOD_MONTHS = {'monthly': 1, 'quarterly': 3}
+
+# Display names of the derived high-risk flags
+HIGH_RISK_GROUP_LABELS = {'HIV_Positive': 'HIV positive', 'Under15': 'Under 15', 'Above65': 'Above 65'}
+
+# Trailing window lengths (months) for the rolling incidence and cure-rate trends
+ROLLING_WINDOWS = (3, 6, 12)
+
+# Upper bound on resample x distinct-row cells drawn per bootstrap batch
+BOOTSTRAP_BATCH_CELLS = 4000000
+
+# Ages are binned once into single-year codes; bands are folded from these codes
+MAX_AGE = 120
+UNKNOWN_AGE = MAX_AGE + 1
+
+# Lower edge of each age band (the last band is open-ended)
+AGE_BAND_SCHEMES = {
+    'who': [0, 5, 15, 25, 35, 45, 55, 65],
+    'pediatric': [0, 5, 15],
+    'broad': [0, 15, 65]
+}
+
+def age_band_labels(edges):
+    """Labels for the bands of an age scheme, with unknown ages last"""
+    labels = [
+        f"{lower}+" if upper is None else f"{lower}–{upper - 1}"
+        for lower, upper in zip(edges, list(edges[1:]) + [None])
+    ]
+    return labels + ['Unknown']
+
+def age_band_lookup(edges):
+    """Band index for every single-year age code, with unknown ages last"""
+    lookup = np.digitize(np.arange(MAX_AGE + 1), edges) - 1
+    return np.append(lookup, len(edges))
+
+def target_status(values, target, target_type="higher_better"):
+    """Target status code for every value: 0 met, 1 close, 2 missed, -1 no data"""
+    values = np.asarray(values, dtype=float)
+    if target_type == "higher_better":
+        met, close = values >= target, values >= target * TARGET_WARNING_RATIOS[target_type]
+    else:
+        met, close = values <= target, values <= target * TARGET_WARNING_RATIOS[target_type]
+    return np.select([np.isnan(values), met, close], [-1, 0, 1], default=2)
+
+# Windows precomputed in the background whenever the data version changes; the last month and
+# quarter are the latest ones the data fully covers
+PRESET_WINDOWS = ['Full range', 'Last month', 'Last quarter', 'Last 6 months',
+                  'Last 12 months', 'Calendar quarters']
+
+# Result caches shared by generators built from the same data version and engine; results of
+# the preset precompute are kept apart from the LRU so later traffic never evicts them
+_RESULT_CACHES = OrderedDict()
+_RESULT_CACHES_LOCK = threading.Lock()
+_MAX_CACHED_VERSIONS = 2
+_MAX_CACHED_RESULTS = 1024
+
+# Filtered views kept per generator, so calls for the same window share one copy
+_MAX_FILTERED_VIEWS = 4
+
+# Thread pool shared by all generators for building figures concurrently
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+def _get_executor():
+    """Get the shared figure-building thread pool, starting it on first use"""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                           thread_name_prefix="tb-figures")
+        return _EXECUTOR
+
+def _get_result_cache(cache_key):
+    """Get the result and preset caches for a data version and engine, dropping the oldest ones"""
+    with _RESULT_CACHES_LOCK:
+        if cache_key not in _RESULT_CACHES:
+            _RESULT_CACHES[cache_key] = (OrderedDict(), {})
+            while len(_RESULT_CACHES) > _MAX_CACHED_VERSIONS:
+                _RESULT_CACHES.popitem(last=False)
+        _RESULT_CACHES.move_to_end(cache_key)
+        return _RESULT_CACHES[cache_key]
+
+def figure_payload_size(fig):
+    """Size in bytes of the JSON sent to the browser for a figure"""
+    import plotly.io as pio
+    return len(pio.to_json(fig, validate=False).encode('utf-8'))
+
+def cached_result(method):
+    """Memoize a chart/KPI method per data version and call arguments"""
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (method.__name__,) + tuple(bound.arguments.items())[1:]
+        
+        cache = self._result_cache
+        presets = self._preset_cache
+        precomputing = threading.current_thread() is self._precompute_thread
+        with _RESULT_CACHES_LOCK:
+            if key in presets:
+                return presets[key]
+            if key in cache:
+                # A result the precompute needs moves out of reach of the LRU
+                if precomputing:
+                    presets[key] = cache.pop(key)
+                    return presets[key]
+                cache.move_to_end(key)
+                return cache[key]
+        
+        result = method(self, *args, **kwargs)
+        with _RESULT_CACHES_LOCK:
+            if precomputing:
+                return presets.setdefault(key, result)
+            result = cache.setdefault(key, result)
+            while len(cache) > _MAX_CACHED_RESULTS:
+                cache.popitem(last=False)
+        return result
+    
+    return wrapper
 
 class TBChartGenerator:
-    def __init__(self, df):
+    def __init__(self, df, engine='pandas', data_version=None):
+        if engine not in ('pandas', 'polars'):
+            raise ValueError(f"Unknown engine: {engine}")
+        self.engine = engine
+        self._polars = None
         self.df = df.copy()
+        # The loaded rows are only read, for exports; preprocessing works on the copy
+        self._source_df = df
+        self._source_positions = np.arange(len(df))
         self.rwanda_population = 14260000
         self.colors = {
             'cured': '#2E8B57',
@@ -15,53 +202,139 @@ class TBChartGenerator:
             'high_risk': '#DC143C',
             'new_cases': '#4169E1',
             'relapse': '#FF8C00',
-            'diagnosed': '#1E90FF'
+            'diagnosed': '#1E90FF',
+            'aberration': '#FFD700',
+            'target_good': '#00c851',
+            'target_warning': '#ffbb33',
+            'target_danger': '#ff4444'
         }
+        self._timeline = None
+        self._filtered_views = OrderedDict()
+        self._filtered_views_lock = threading.Lock()
+        # Callers that know where the data came from pass a version, sparing a hash of every row
+        if data_version is None:
+            data_version = format(int(pd.util.hash_pandas_object(self.df, index=False).sum()), 'x')
+        self.data_version = data_version
+        self._precompute_thread = None
+        self._result_cache, self._preset_cache = _get_result_cache((self.data_version, self.engine))
+        self._precompute_progress = {'done': 0, 'total': 0}
         self._preprocess_data()
     
+    def _validate_data(self):
+        """Coerce typed columns once at load and record data-quality counts"""
+        date_col = 'Enrollment date(Diagnostic Date)'
+        report = {'rows_loaded': len(self.df)}
+        
+        # Rows without a usable enrollment date are dropped
+        raw_dates = self.df[date_col]
+        self.df[date_col] = pd.to_datetime(raw_dates, errors='coerce')
+        bad_dates = self.df[date_col].isna()
+        report['missing_dates_dropped'] = int(raw_dates.isna().sum())
+        report['unparseable_dates_dropped'] = int((bad_dates & raw_dates.notna()).sum())
+        self.df = self.df[~bad_dates].copy()
+        self._source_positions = np.flatnonzero(~bad_dates.to_numpy())
+        
+        # Age stays NaN when it cannot be parsed
+        raw_age = self.df['TB_Current age']
+        self.df['TB_Current age'] = pd.to_numeric(raw_age, errors='coerce')
+        report['non_numeric_age'] = int((self.df['TB_Current age'].isna() & raw_age.notna()).sum())
+        
+        # Contact counts: unparseable or missing values count as zero
+        report['non_numeric_contact_counts'] = {}
+        report['missing_ltbi_columns'] = [col for col in UNDER5_COLS if col not in self.df.columns]
+        for col in UNDER5_COLS:
+            if col in self.df.columns:
+                raw = self.df[col]
+                coerced = pd.to_numeric(raw, errors='coerce')
+                report['non_numeric_contact_counts'][col] = int((coerced.isna() & raw.notna()).sum())
+                self.df[col] = coerced.fillna(0)
+        
+        if report['missing_ltbi_columns']:
+            report['tpt_exceeds_eligible'] = 0
+        else:
+            eligible = (self.df[UNDER5_COLS[0]] - self.df[UNDER5_COLS[1]]).clip(lower=0)
+            report['tpt_exceeds_eligible'] = int((self.df[UNDER5_COLS[2]] > eligible).sum())
+        
+        # Outcome labels outside the known set (blank outcomes are not counted)
+        outcomes = self.df['Treatment outcome'].dropna().astype(str).str.strip()
+        outcomes = outcomes[outcomes != '']
+        unknown = outcomes[~outcomes.str.lower().isin(KNOWN_OUTCOMES)]
+        report['unknown_outcome_labels'] = {
+            str(label): int(count) for label, count in unknown.value_counts().items()
+        }
+        
+        self.quality_report = report
+    
+    def get_quality_report(self):
+        """Return the data-quality counts recorded at load"""
+        report = dict(self.quality_report)
+        report['non_numeric_contact_counts'] = dict(report['non_numeric_contact_counts'])
+        report['unknown_outcome_labels'] = dict(report['unknown_outcome_labels'])
+        return report
+    
     def _preprocess_data(self):
         """Preprocess the TB data for analysis"""
-        # Convert enrollment date to datetime
+        if self.engine == 'polars':
+            self._preprocess_polars()
+            return
+        
+        # Coerce dates and numeric columns once
+        self._validate_data()
         date_col = 'Enrollment date(Diagnostic Date)'
-        self.df[date_col] = pd.to_datetime(self.df[date_col], errors='coerce')
-        self.df = self.df.dropna(subset=[date_col]).copy()
         
         # Extract Year-Month period
         self.df['YearMonth'] = self.df[date_col].dt.to_period('M')
         self.df['Quarter'] = self.df[date_col].dt.to_period('Q')
+        self.df['Week'] = self.df[date_col].dt.to_period('W')
+        self.df['Day'] = self.df[date_col].dt.to_period('D')
         
-        # Process treatment outcomes
-        self.df['Is_Cured'] = self.df['Treatment outcome'].apply(
-            lambda x: 1 if str(x).strip().lower() == 'cured' else 0
-        )
+        # Single years of age as small integer codes (missing or implausible ages are unknown)
+        age = self.df['TB_Current age'].to_numpy(dtype=float)
+        known = (age >= 0) & (age <= MAX_AGE)
+        self.df['Age_Code'] = np.where(known, np.floor(np.nan_to_num(age)), UNKNOWN_AGE).astype(np.uint8)
         
-        self.df['Is_CuredCompleted'] = self.df['Treatment outcome'].apply(
-            lambda x: 1 if str(x).strip().lower() in ['cured', 'completed'] else 0
-        )
+        # Process treatment outcomes
+        outcome = self.df['Treatment outcome'].astype(str).str.strip().str.lower()
+        self.df['Is_Cured'] = (outcome == 'cured').astype(int)
+        self.df['Is_CuredCompleted'] = outcome.isin(['cured', 'completed']).astype(int)
         
         # Process high-risk groups
         self._process_high_risk_groups()
         
         # Process TB notifications
-        self.df['New_Case'] = self.df['Previous treatment history'].str.strip().str.lower() == 'new'
-        self.df['Relapse_Case'] = self.df['Previous treatment history'].str.strip().str.lower() == 'relapse'
+        history = self.df['Previous treatment history'].str.strip().str.lower()
+        self.df['New_Case'] = history == 'new'
+        self.df['Relapse_Case'] = history == 'relapse'
+        self.df['New_or_Relapse'] = self.df['New_Case'] | self.df['Relapse_Case']
         
         # Process age groups
-        self.df['TB_Current age'] = pd.to_numeric(self.df['TB_Current age'], errors='coerce')
         self.df['Under14'] = self.df['TB_Current age'] < 14
     
+    def _preprocess_polars(self):
+        """Validate, coerce and derive the analysis columns with the multithreaded Polars query plan"""
+        try:
+            from polars_engine import PolarsEngine
+        except ImportError as e:
+            raise ImportError("The polars engine requires polars (pip install polars)") from e
+        
+        self._polars = PolarsEngine(self.df)
+        derived, self.quality_report, kept = self._polars.prepare()
+        
+        # Coerced and derived columns replace the raw ones, as in the pandas path
+        self.df = self.df.iloc[kept].copy()
+        self._source_positions = kept
+        derived.index = self.df.index
+        for col in derived.columns:
+            self.df[col] = derived[col]
+    
     def _process_high_risk_groups(self):
         """Process high-risk group flags"""
         # Age-based flags
-        self.df['TB_Current age'] = pd.to_numeric(self.df['TB_Current age'], errors='coerce')
         self.df['Under15'] = self.df['TB_Current age'] < 15
         self.df['Above65'] = self.df['TB_Current age'] > 65
         
         # Yes/No columns
-        yes_no_cols = ['Prisoners', 'Contact of TPB+', 'Contact of MDR - TB',
-                       'Diabetic (new)', 'Mining worker (new)', 'Refugee ']
-        
-        for col in yes_no_cols:
+        for col in YES_NO_COLS:
             if col in self.df.columns:
                 self.df[col] = self.df[col].astype(str).str.strip().str.lower().map(
                     {'yes': True, 'no': False}
@@ -74,7 +347,7 @@ class TBChartGenerator:
             self.df['HIV_Positive'] = False
         
         # Combine all high-risk flags
-        available_flags = [col for col in yes_no_cols if col in self.df.columns]
+        available_flags = [col for col in YES_NO_COLS if col in self.df.columns]
         high_risk_flags = available_flags + ['HIV_Positive', 'Under15', 'Above65']
         
         self.df['High_Risk'] = self.df[high_risk_flags].any(axis=1)
@@ -99,58 +372,54 @@ class TBChartGenerator:
         }
     
     def _apply_period_filter(self, period_filter):
-        """Apply date range filter to dataframe"""
+        """Apply date range filter to dataframe, sharing one read-only view per window"""
         if period_filter is None:
             return self.df
         
-        start_date, end_date = period_filter
-        date_col = 'Enrollment date(Diagnostic Date)'
-        return self.df[
-            (self.df[date_col] >= start_date) & 
-            (self.df[date_col] <= end_date)
-        ].copy()
+        key = tuple(pd.Timestamp(date) for date in period_filter)
+        with self._filtered_views_lock:
+            if key in self._filtered_views:
+                self._filtered_views.move_to_end(key)
+                return self._filtered_views[key]
+        
+        if self._polars is not None:
+            filtered_df = self.df.iloc[self._polars.window_positions(period_filter)].copy()
+        else:
+            start_date, end_date = period_filter
+            date_col = 'Enrollment date(Diagnostic Date)'
+            filtered_df = self.df[
+                (self.df[date_col] >= start_date) & 
+                (self.df[date_col] <= end_date)
+            ].copy()
+        
+        with self._filtered_views_lock:
+            self._filtered_views[key] = filtered_df
+            while len(self._filtered_views) > _MAX_FILTERED_VIEWS:
+                self._filtered_views.popitem(last=False)
+        return filtered_df
     
     def _calculate_ltbi_coverage(self, df_subset):
         """Calculate LTBI coverage percentage"""
-        try:
-            under5_cols = [
-                'Number of contacts <5 years living with index case',
-                'Number of positive TB cases among contacts <5 years',
-                'Number of < 5 years contacts with TPT completed'
-            ]
-            
-            # Check if columns exist
-            missing_cols = [col for col in under5_cols if col not in df_subset.columns]
-            if missing_cols:
-                return 0.0
-            
-            # Convert to numeric
-            for col in under5_cols:
-                df_subset[col] = pd.to_numeric(df_subset[col], errors='coerce').fillna(0)
-            
-            # Calculate eligible children
-            eligible = (df_subset['Number of contacts <5 years living with index case'] - 
-                       df_subset['Number of positive TB cases among contacts <5 years'])
-            eligible = eligible.clip(lower=0)  # Ensure non-negative
-            
-            # Calculate coverage
-            completed = df_subset['Number of < 5 years contacts with TPT completed']
-            coverage = (completed.sum() / eligible.sum() * 100) if eligible.sum() > 0 else 0
-            
-            return min(coverage, 100)  # Cap at 100%
-            
-        except Exception:
+        # Contact columns are coerced at load; missing columns are in the quality report
+        if any(col not in df_subset.columns for col in UNDER5_COLS):
             return 0.0
+        
+        # Calculate eligible children
+        eligible = (df_subset['Number of contacts <5 years living with index case'] - 
+                   df_subset['Number of positive TB cases among contacts <5 years'])
+        eligible = eligible.clip(lower=0)  # Ensure non-negative
+        
+        # Calculate coverage
+        completed = df_subset['Number of < 5 years contacts with TPT completed']
+        coverage = (completed.sum() / eligible.sum() * 100) if eligible.sum() > 0 else 0
+        
+        return min(coverage, 100)  # Cap at 100%
     
     def _calculate_yearly_incidence(self, df_subset):
         """Calculate yearly normalized TB incidence per 100,000"""
         try:
             # Count new and relapse cases
-            new_relapse_cases = df_subset[
-                df_subset['Previous treatment history'].str.strip().str.lower().isin(['new', 'relapse'])
-            ]
-            
-            total_cases = len(new_relapse_cases)
+            total_cases = int(df_subset['New_or_Relapse'].sum())
             
             # Get time span in months
             if len(df_subset) == 0:
@@ -171,27 +440,764 @@ class TBChartGenerator:
         except Exception:
             return 0.0
     
-    def create_treatment_outcome_pie(self, period_filter=None, use_completed=False):
-        """Create pie chart for treatment outcomes"""
+    def _get_timeline(self):
+        """Cumulative KPI inputs per enrollment timestamp, built once per dataset"""
+        if self._timeline is not None:
+            return self._timeline
+        
+        has_ltbi = all(col in self.df.columns for col in UNDER5_COLS)
+        if self._polars is not None:
+            per_date = self._polars.per_date_totals(has_ltbi)
+        else:
+            date_col = 'Enrollment date(Diagnostic Date)'
+            inputs = pd.DataFrame({
+                'rows': 1,
+                'cured': self.df['Is_Cured'],
+                'new_relapse': self.df['New_or_Relapse'].astype(int),
+                'new': self.df['New_Case'].astype(int),
+                'relapse': self.df['Relapse_Case'].astype(int),
+                date_col: self.df[date_col]
+            }, index=self.df.index)
+            
+            if has_ltbi:
+                inputs['eligible'] = (self.df[UNDER5_COLS[0]] - self.df[UNDER5_COLS[1]]).clip(lower=0)
+                inputs['tpt_completed'] = self.df[UNDER5_COLS[2]]
+            
+            per_date = inputs.groupby(date_col).sum().sort_index()
+        
+        # Prepend a zero row so a window's total is cum[stop] - cum[start]
+        cum = {
+            col: np.concatenate([[0], per_date[col].to_numpy().cumsum()])
+            for col in per_date.columns
+        }
+        self._timeline = {
+            'dates': per_date.index.to_numpy(),
+            'cum': cum,
+            'has_ltbi': has_ltbi
+        }
+        return self._timeline
+    
+    def _window_totals(self, period_filter):
+        """Sum KPI inputs over a date window using the cumulative timeline"""
+        timeline = self._get_timeline()
+        dates = timeline['dates']
+        
+        if period_filter is None:
+            start, stop = 0, len(dates)
+        else:
+            start_date, end_date = period_filter
+            start = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), side='left')
+            stop = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date)), side='right')
+            stop = max(start, stop)
+        
+        totals = {col: values[stop] - values[start] for col, values in timeline['cum'].items()}
+        totals['has_ltbi'] = timeline['has_ltbi']
+        totals['min_date'] = pd.Timestamp(dates[start]) if stop > start else None
+        totals['max_date'] = pd.Timestamp(dates[stop - 1]) if stop > start else None
+        return totals
+    
+    def _kpis_from_totals(self, totals):
+        """Turn window totals into the big-number KPIs"""
+        # LTBI coverage
+        ltbi_coverage = 0.0
+        if totals['has_ltbi'] and totals['eligible'] > 0:
+            ltbi_coverage = min(totals['tpt_completed'] / totals['eligible'] * 100, 100)
+        
+        # Yearly normalized incidence
+        yearly_incidence = 0.0
+        if totals['rows'] > 0:
+            months_span = max(1, (totals['max_date'] - totals['min_date']).days / 30.44)
+            yearly_cases = (totals['new_relapse'] / months_span) * 12
+            yearly_incidence = (yearly_cases / self.rwanda_population) * 100000
+        
+        return {
+            'total_cured': int(totals['cured']),
+            'ltbi_coverage': round(ltbi_coverage, 1),
+            'yearly_incidence': round(yearly_incidence, 1)
+        }
+    
+    @cached_result
+    def get_kpi_intervals(self, period_filter=None, use_completed=False, n_resamples=1000,
+                          confidence=0.95, time_budget=0.5, seed=0):
+        """Bootstrap confidence intervals for LTBI coverage, cure rate and yearly incidence"""
+        started = time.perf_counter()
+        has_ltbi = all(col in self.df.columns for col in UNDER5_COLS)
+        date_col = 'Enrollment date(Diagnostic Date)'
+        
+        # Resampling rows with replacement is a multinomial draw over the distinct rows
+        if self._polars is not None:
+            rows = self._polars.bootstrap_rows(period_filter, use_completed, has_ltbi)
+            n, distinct, row_counts = rows['rows'], rows['distinct'], rows['counts']
+            first_date, last_date = rows['first'], rows['last']
+        else:
+            filtered_df = self.df.iloc[self._period_positions(period_filter)]
+            n = len(filtered_df)
+            zeros = np.zeros(n)
+            values = np.column_stack([
+                (filtered_df[UNDER5_COLS[0]] - filtered_df[UNDER5_COLS[1]]).clip(lower=0) if has_ltbi else zeros,
+                filtered_df[UNDER5_COLS[2]] if has_ltbi else zeros,
+                filtered_df['Is_CuredCompleted' if use_completed else 'Is_Cured'],
+                filtered_df['New_or_Relapse']
+            ]).astype(float)
+            counted = pd.DataFrame(values).value_counts(sort=False)
+            distinct = np.array(counted.index.tolist(), dtype=float).reshape(-1, 4)
+            row_counts = counted.to_numpy()
+            first_date, last_date = filtered_df[date_col].min(), filtered_df[date_col].max()
+        if n == 0:
+            return None
+        
+        probabilities = row_counts / n
+        batch_size = max(1, min(n_resamples, BOOTSTRAP_BATCH_CELLS // len(distinct)))
+        
+        rng = np.random.default_rng(seed)
+        sums = []
+        done = 0
+        while done < n_resamples:
+            size = min(batch_size, n_resamples - done)
+            sums.append(rng.multinomial(n, probabilities, size=size) @ distinct)
+            done += size
+            if time.perf_counter() - started > time_budget:
+                break
+        sums = np.vstack(sums)
+        
+        # The window's time span stays fixed under resampling
+        months_span = max(1, (last_date - first_date).days / 30.44)
+        incidence_factor = 12 / months_span / self.rwanda_population * 100000
+        
+        eligible, completed, cured, new_relapse = sums.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ltbi = np.where(eligible > 0, np.minimum(completed / eligible * 100, 100), 0.0)
+        resampled = {
+            'ltbi_coverage': ltbi,
+            'cure_rate': cured / n * 100,
+            'yearly_incidence': new_relapse * incidence_factor
+        }
+        
+        # Point estimates from the observed window
+        total_eligible, total_completed, total_cured, total_new_relapse = row_counts @ distinct
+        estimates = {
+            'ltbi_coverage': min(total_completed / total_eligible * 100, 100) if total_eligible > 0 else 0.0,
+            'cure_rate': total_cured / n * 100,
+            'yearly_incidence': total_new_relapse * incidence_factor
+        }
+        
+        tail = (1 - confidence) / 2 * 100
+        intervals = {}
+        for key, stats in resampled.items():
+            low, high = np.percentile(stats, [tail, 100 - tail])
+            intervals[key] = {
+                'estimate': round(float(estimates[key]), 1),
+                'low': round(float(low), 1),
+                'high': round(float(high), 1)
+            }
+        
+        intervals['resamples'] = done
+        intervals['elapsed'] = time.perf_counter() - started
+        return intervals
+    
+    def _comparison_window(self, period_filter, comparison):
+        """Get the comparison window for a selected window"""
+        if period_filter is None:
+            date_col = 'Enrollment date(Diagnostic Date)'
+            period_filter = (self.df[date_col].min().normalize(), self.df[date_col].max().normalize())
+        
+        start_date, end_date = pd.Timestamp(period_filter[0]), pd.Timestamp(period_filter[1])
+        if comparison == 'previous_period':
+            span = pd.Timedelta(days=(end_date - start_date).days + 1)
+            return (start_date - span, end_date - span)
+        if comparison == 'last_year':
+            return (start_date - pd.DateOffset(years=1), end_date - pd.DateOffset(years=1))
+        raise ValueError(f"Unknown comparison: {comparison}")
+    
+    @cached_result
+    def get_big_numbers_comparison(self, period_filter=None, comparisons=('previous_period', 'last_year')):
+        """Calculate key metrics for the selected window and its comparison windows"""
+        current = self._kpis_from_totals(self._window_totals(period_filter))
+        result = {'current': current}
+        
+        for comparison in comparisons:
+            window = self._comparison_window(period_filter, comparison)
+            totals = self._window_totals(window)
+            kpis = self._kpis_from_totals(totals)
+            
+            # No deltas against a window without any cases
+            if totals['rows'] > 0:
+                delta = {key: round(current[key] - kpis[key], 1) for key in current}
+            else:
+                delta = {key: None for key in current}
+            
+            result[comparison] = {'window': window, 'kpis': kpis, 'delta': delta}
+        
+        return result
+    
+    @cached_result
+    def get_notification_counts(self, period_filter=None):
+        """New and relapse counts for the latest month of a window and the same days of the month before"""
+        totals = self._window_totals(period_filter)
+        if totals['rows'] == 0:
+            return None
+        
+        latest_month = totals['max_date'].to_period('M')
+        month_start = latest_month.start_time
+        if period_filter is not None:
+            month_start = max(month_start, pd.Timestamp(period_filter[0]).normalize())
+        latest = self._window_totals((month_start, totals['max_date']))
+        
+        # A partly covered month is compared with the same days of the previous month,
+        # so a month still being reported does not read as a fall in cases
+        previous_month = latest_month - 1
+        previous_start = previous_month.start_time + (month_start - latest_month.start_time)
+        previous_end = min(previous_month.start_time + (totals['max_date'].normalize() - latest_month.start_time),
+                           previous_month.end_time.normalize())
+        previous = self._window_totals((previous_start, previous_end + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')))
+        
+        return {
+            'month': latest_month,
+            'partial': month_start > latest_month.start_time or
+                       totals['max_date'].normalize() < latest_month.end_time.normalize(),
+            'previous_window': (previous_start, previous_end),
+            'new': int(latest['new']),
+            'relapse': int(latest['relapse']),
+            'new_delta': int(latest['new'] - previous['new']),
+            'relapse_delta': int(latest['relapse'] - previous['relapse'])
+        }
+    
+    def _period_positions(self, period_filter):
+        """Row positions inside a date window, without copying any rows"""
+        if period_filter is None:
+            return np.arange(len(self.df))
+        if self._polars is not None:
+            return self._polars.window_positions(period_filter)
+        
+        start_date, end_date = period_filter
+        date_col = 'Enrollment date(Diagnostic Date)'
+        return np.flatnonzero(
+            ((self.df[date_col] >= start_date) & (self.df[date_col] <= end_date)).to_numpy()
+        )
+    
+    def iter_line_list(self, period_filter=None, chunk_size=50000):
+        """Yield the filtered line list in chunks of the loaded rows, with their values as loaded"""
+        positions = self._source_positions[self._period_positions(period_filter)]
+        
+        # An empty window still yields one empty chunk so exports keep their header
+        for start in range(0, max(len(positions), 1), chunk_size):
+            yield self._source_df.iloc[positions[start:start + chunk_size]]
+    
+    @cached_result
+    def get_period_table(self, period_filter=None, period_type='monthly'):
+        """Per-period aggregates behind the time series charts"""
+        group_col = PERIOD_COLUMNS[period_type]
+        
+        if self._polars is not None:
+            period_table = self._polars.period_table(period_filter, group_col)
+        else:
+            filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
+            period_table = filtered_df.groupby(group_col).agg(
+                Cases=(group_col, 'size'),
+                Diagnosed=('Method of TB confirmation', 'count'),
+                Cured=('Is_Cured', 'sum'),
+                CuredCompleted=('Is_CuredCompleted', 'sum'),
+                High_Risk=('High_Risk', 'sum'),
+                New=('New_Case', 'sum'),
+                Relapse=('Relapse_Case', 'sum')
+            ).reset_index().rename(columns={group_col: 'Period'})
+        
+        period_table.insert(1, 'Date', period_table['Period'].dt.to_timestamp())
+        
+        # Calculate incidence per 100,000
+        period_table['New_rate'] = period_table['New'] / self.rwanda_population * 100000
+        period_table['Relapse_rate'] = period_table['Relapse'] / self.rwanda_population * 100000
+        
+        return period_table
+    
+    @cached_result
+    def _age_year_counts(self, period_filter=None, period_type='monthly'):
+        """Cases, new/relapse and cured per period and single year of age in one bincount pass"""
+        group_col = PERIOD_COLUMNS[period_type]
+        freq = self.df[group_col].dtype.freq
+        n_ages = UNKNOWN_AGE + 1
+        
+        # Per-row weights, or per-(period, age) counts already grouped by the Polars engine
+        if self._polars is not None:
+            grouped = self._polars.age_year_counts(period_filter, group_col)
+            ordinals, ages = grouped[group_col], grouped['Age_Code']
+            weights = {key: grouped[key].astype(float) for key in ('cases', 'new_relapse', 'cured')}
+        else:
+            rows = self.df.iloc[self._period_positions(period_filter)]
+            ordinals, ages = pd.PeriodIndex(rows[group_col]).asi8, rows['Age_Code'].to_numpy()
+            weights = {
+                'cases': np.ones(len(rows)),
+                'new_relapse': rows['New_or_Relapse'].to_numpy(dtype=float),
+                'cured': rows['Is_Cured'].to_numpy(dtype=float)
+            }
+        
+        if len(ordinals) == 0:
+            empty = np.zeros((0, n_ages), dtype=np.int64)
+            return {'periods': [], 'cases': empty, 'new_relapse': empty, 'cured': empty}
+        
+        first = ordinals.min()
+        n_periods = ordinals.max() - first + 1
+        cells = (ordinals - first) * n_ages + ages.astype(np.int64)
+        
+        def counts(key):
+            return np.bincount(
+                cells, weights=weights[key], minlength=n_periods * n_ages
+            ).reshape(n_periods, n_ages).astype(np.int64)
+        
+        cases, new_relapse, cured = counts('cases'), counts('new_relapse'), counts('cured')
+        
+        # Keep only periods with cases, like the groupby-based period table
+        observed = cases.sum(axis=1) > 0
+        all_periods = pd.period_range(pd.Period(ordinal=first, freq=freq),
+                                      pd.Period(ordinal=ordinals.max(), freq=freq), freq=freq)
+        return {
+            'periods': list(all_periods[observed]),
+            'cases': cases[observed],
+            'new_relapse': new_relapse[observed],
+            'cured': cured[observed]
+        }
+    
+    def _fold_age_bands(self, counts, scheme):
+        """Sum single-year age columns into the bands of a scheme"""
+        lookup = age_band_lookup(AGE_BAND_SCHEMES[scheme])
+        one_hot = np.eye(lookup.max() + 1, dtype=np.int64)[lookup]
+        return counts @ one_hot
+    
+    @cached_result
+    def get_age_band_table(self, period_filter=None, period_type='monthly', scheme='who'):
+        """Per-period, per-band case counts for an age scheme"""
+        year_counts = self._age_year_counts(period_filter, period_type)
+        labels = age_band_labels(AGE_BAND_SCHEMES[scheme])
+        
+        band_counts = {
+            key: self._fold_age_bands(year_counts[key], scheme)
+            for key in ('cases', 'new_relapse', 'cured')
+        }
+        n_periods = len(year_counts['periods'])
+        
+        return pd.DataFrame({
+            'Period': np.repeat(np.array(year_counts['periods'], dtype=object), len(labels)),
+            'Band': np.tile(labels, n_periods),
+            'Cases': band_counts['cases'].ravel(),
+            'New_Relapse': band_counts['new_relapse'].ravel(),
+            'Cured': band_counts['cured'].ravel()
+        })
+    
+    @cached_result
+    def get_age_band_kpis(self, period_filter=None, scheme='who'):
+        """Cases, share, new/relapse and cure rate for each age band in a window"""
+        year_counts = self._age_year_counts(period_filter, 'monthly')
+        labels = age_band_labels(AGE_BAND_SCHEMES[scheme])
+        
+        totals = {
+            key: self._fold_age_bands(year_counts[key].sum(axis=0), scheme)
+            for key in ('cases', 'new_relapse', 'cured')
+        }
+        cases = totals['cases']
+        
+        total_cases = cases.sum()
+        share = cases / total_cases * 100 if total_cases > 0 else np.zeros(len(cases))
+        cure_rate = np.where(cases > 0, totals['cured'] / np.maximum(cases, 1) * 100, 0.0)
+        
+        return pd.DataFrame({
+            'Band': labels,
+            'Cases': cases,
+            'Share (%)': np.round(share, 1),
+            'New/Relapse': totals['new_relapse'],
+            'Cure Rate (%)': np.round(cure_rate, 1)
+        })
+    
+    @cached_result
+    def get_target_matrix(self, period_filter=None, period_type='monthly'):
+        """Target status of LTBI coverage (overall and per high-risk group) and yearly incidence for every period"""
+        if period_type not in PERIOD_MONTHS:
+            raise ValueError(f"Target attainment needs monthly or quarterly periods, not {period_type}")
+        
+        columns = ['Metric', 'Group', 'Period', 'Date', 'Value', 'Status']
+        group_col = PERIOD_COLUMNS[period_type]
+        freq = self.df[group_col].dtype.freq
+        has_ltbi = all(col in self.df.columns for col in UNDER5_COLS)
+        group_cols = [col for col in YES_NO_COLS if col in self.df.columns] + ['HIV_Positive', 'Under15', 'Above65']
+        groups = ['All cases'] + [HIGH_RISK_GROUP_LABELS.get(col, col.strip()) for col in group_cols]
+        
+        # Every (period, group) membership is one cell: per-row memberships, or per-(period, group)
+        # sums already aggregated by the Polars engine
+        if self._polars is not None:
+            grouped = self._polars.group_period_sums(period_filter, group_col, group_cols, has_ltbi)
+            ordinals, member_groups = grouped[group_col], grouped['group']
+            weights = {key: grouped[key] for key in ('cases', 'eligible', 'completed', 'new_relapse')}
+        else:
+            rows = self.df.iloc[self._period_positions(period_filter)]
+            members = np.column_stack(
+                [np.ones(len(rows), dtype=bool)] + [rows[col].to_numpy(dtype=bool) for col in group_cols]
+            )
+            member_rows, member_groups = np.nonzero(members)
+            ordinals = pd.PeriodIndex(rows[group_col]).asi8[member_rows]
+            zeros = np.zeros(len(rows))
+            weights = {
+                'cases': np.ones(len(rows)),
+                'eligible': (rows[UNDER5_COLS[0]] - rows[UNDER5_COLS[1]]).clip(lower=0).to_numpy(dtype=float)
+                            if has_ltbi else zeros,
+                'completed': rows[UNDER5_COLS[2]].to_numpy(dtype=float) if has_ltbi else zeros,
+                'new_relapse': rows['New_or_Relapse'].to_numpy(dtype=float)
+            }
+            weights = {key: values[member_rows] for key, values in weights.items()}
+        
+        if len(ordinals) == 0:
+            return pd.DataFrame(columns=columns)
+        
+        first = ordinals.min()
+        n_periods = ordinals.max() - first + 1
+        cells = (ordinals - first) * len(groups) + member_groups
+        
+        def sums(key):
+            return np.bincount(
+                cells, weights=weights[key], minlength=n_periods * len(groups)
+            ).reshape(n_periods, len(groups))
+        
+        cases, eligible, completed = sums('cases'), sums('eligible'), sums('completed')
+        new_relapse = sums('new_relapse')[:, 0]
+        
+        # Coverage has no value where nobody was eligible
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coverage = np.where(eligible > 0, np.minimum(completed / eligible * 100, 100), np.nan)
+        incidence = new_relapse * 12 / PERIOD_MONTHS[period_type] / self.rwanda_population * 100000
+        
+        # Keep only periods with cases, like the groupby-based period table
+        observed = cases[:, 0] > 0
+        all_periods = pd.period_range(pd.Period(ordinal=first, freq=freq),
+                                      pd.Period(ordinal=ordinals.max(), freq=freq), freq=freq)[observed]
+        coverage, incidence = coverage[observed], incidence[observed]
+        
+        # Edge periods only partly covered by the data or the window are annualized over the days covered
+        date_col = 'Enrollment date(Diagnostic Date)'
+        covered_start, covered_end = self.df[date_col].min().normalize(), self.df[date_col].max().normalize()
+        if period_filter is not None:
+            covered_start = max(covered_start, pd.Timestamp(period_filter[0]).normalize())
+            covered_end = min(covered_end, pd.Timestamp(period_filter[1]).normalize())
+        period_starts, period_ends = all_periods.start_time, all_periods.end_time.normalize()
+        covered_days = (period_ends.where(period_ends < covered_end, covered_end) -
+                        period_starts.where(period_starts > covered_start, covered_start)).days + 1
+        incidence = incidence * ((period_ends - period_starts).days + 1).to_numpy() / covered_days.to_numpy()
+        
+        ltbi_target, ltbi_type = TARGETS['ltbi_coverage']
+        incidence_target, incidence_type = TARGETS['yearly_incidence']
+        return pd.DataFrame({
+            'Metric': ['LTBI coverage'] * coverage.size + ['Yearly incidence'] * incidence.size,
+            'Group': np.concatenate([np.tile(groups, len(all_periods)), np.repeat('All cases', len(all_periods))]),
+            'Period': np.concatenate([np.repeat(all_periods, len(groups)), all_periods]),
+            'Date': np.concatenate([np.repeat(all_periods.to_timestamp(), len(groups)), all_periods.to_timestamp()]),
+            'Value': np.concatenate([coverage.ravel(), incidence]),
+            'Status': np.concatenate([
+                target_status(coverage.ravel(), ltbi_target, ltbi_type),
+                target_status(incidence, incidence_target, incidence_type)
+            ])
+        }, columns=columns)
+    
+    def get_preset_windows(self, names=None):
+        """Get date windows for the preset names, relative to the latest data"""
+        names = PRESET_WINDOWS if names is None else names
+        date_col = 'Enrollment date(Diagnostic Date)'
+        min_date = self.df[date_col].min().normalize()
+        max_date = self.df[date_col].max().normalize()
+        
+        windows = {}
+        for name in names:
+            if name == 'Full range':
+                windows[name] = (min_date, max_date)
+            elif name in ('Last month', 'Last quarter'):
+                period = max_date.to_period('M' if name == 'Last month' else 'Q')
+                if max_date < period.end_time.normalize():
+                    period -= 1
+                if period.end_time >= min_date:
+                    windows[name] = (max(period.start_time, min_date), period.end_time.normalize())
+            elif name.startswith('Last ') and name.endswith(' months'):
+                months = int(name.split()[1])
+                start_date = max_date - pd.DateOffset(months=months) + pd.Timedelta(days=1)
+                windows[name] = (max(start_date, min_date), max_date)
+            elif name == 'Calendar quarters':
+                for quarter in pd.period_range(min_date, max_date, freq='Q'):
+                    windows[f"{quarter.year} Q{quarter.quarter}"] = (
+                        max(quarter.start_time, min_date),
+                        min(quarter.end_time.normalize(), max_date)
+                    )
+            else:
+                raise ValueError(f"Unknown preset window: {name}")
+        
+        return windows
+    
+    def _precompute(self, windows, period_types, use_completed_options):
+        """Compute KPIs and figures for every preset window into the result cache"""
+        for period_filter in windows.values():
+            self.get_big_numbers_comparison(period_filter, comparisons=('previous_period',))
+            self.get_big_numbers_comparison(period_filter, comparisons=('last_year',))
+            self.get_notification_counts(period_filter)
+            self.create_high_risk_pie(period_filter)
+            self.create_under14_pie(period_filter)
+            self.get_age_band_kpis(period_filter)
+            for use_completed in use_completed_options:
+                self.get_kpi_intervals(period_filter, use_completed)
+                self.create_treatment_outcome_pie(period_filter, use_completed)
+                self.create_rolling_trend_chart(period_filter, use_completed=use_completed)
+            for period_type in period_types:
+                self.get_flagged_periods(period_filter, period_type)
+                self.create_age_distribution_chart(period_filter, period_type)
+                self.create_high_risk_time_series(period_filter, period_type)
+                self.create_notification_time_series(period_filter, period_type)
+                if period_type in PERIOD_MONTHS:
+                    self.create_target_heatmap(period_filter, period_type)
+                for use_completed in use_completed_options:
+                    self.create_treatment_time_series(period_filter, period_type, use_completed)
+            self._precompute_progress['done'] += 1
+    
+    def start_precompute(self, preset_names=None, period_types=('monthly', 'quarterly'),
+                         use_completed_options=(False, True)):
+        """Warm the result cache for the preset windows on a background thread"""
+        if self._precompute_thread is not None:
+            return self._precompute_thread
+        
+        windows = self.get_preset_windows(preset_names)
+        self._precompute_progress = {'done': 0, 'total': len(windows)}
+        self._precompute_thread = threading.Thread(
+            target=self._precompute,
+            args=(windows, period_types, use_completed_options),
+            name=f"tb-precompute-{self.data_version[:8]}",
+            daemon=True
+        )
+        self._precompute_thread.start()
+        return self._precompute_thread
+    
+    def get_precompute_progress(self):
+        """Return how many preset windows have been precomputed"""
+        return dict(self._precompute_progress)
+    
+    def _prepare_window(self, period_filter, period_types):
+        """Compute the inputs shared by a window's figures, so concurrent calls do not race to build them"""
+        self._get_timeline()
+        self._apply_period_filter(period_filter)
+        for period_type in period_types:
+            self.get_period_table(period_filter, period_type)
+            self.get_aberrations(period_type)
+    
+    def run_concurrently(self, calls, period_filter=None, period_types=('monthly',), parallel=True):
+        """Run independent figure and KPI calls for one window, on the shared thread pool when parallel.
+        
+        calls maps a name to a zero-argument callable. Returns the results by name and the timings:
+        wall time, the cost of running the calls in turn (measured when not parallel, estimated from
+        the calls' CPU time otherwise), the time saved and each call's CPU time.
+        """
+        started = time.perf_counter()
+        self._prepare_window(period_filter, period_types)
+        prepared = time.perf_counter() - started
+        
+        # Thread CPU time leaves out waiting for other threads, so the calls' sum is a
+        # conservative estimate of what running them in turn would have cost
+        def timed(call):
+            call_started = time.thread_time()
+            result = call()
+            return result, time.thread_time() - call_started
+        
+        if parallel:
+            futures = {name: _get_executor().submit(timed, call) for name, call in calls.items()}
+            outcomes = {name: future.result() for name, future in futures.items()}
+        else:
+            outcomes = {name: timed(call) for name, call in calls.items()}
+        
+        call_times = {name: seconds for name, (_, seconds) in outcomes.items()}
+        wall = time.perf_counter() - started
+        sequential = prepared + sum(call_times.values()) if parallel else wall
+        timings = {
+            'wall': wall,
+            'sequential': sequential,
+            'saved': max(sequential - wall, 0.0),
+            'prepare': prepared,
+            'calls': call_times
+        }
+        return {name: result for name, (result, _) in outcomes.items()}, timings
+    
+    @cached_result
+    def get_aberrations(self, period_type='monthly'):
+        """Aberration flags for the new, relapse and high-risk series over the full history"""
+        period_table = self.get_period_table(None, period_type).set_index('Period')
+        
+        # Periods without any cases count as zero
+        if len(period_table):
+            all_periods = pd.period_range(period_table.index.min(), period_table.index.max(),
+                                          freq=period_table.index.freq)
+            period_table = period_table.reindex(all_periods, fill_value=0)
+        
+        frames = []
+        for series in ABERRATION_SERIES:
+            detector = get_detector((series, period_type))
+            result = detector.update(period_table.index, period_table[series].to_numpy())
+            result.insert(0, 'Series', series)
+            frames.append(result)
+        
+        aberrations = pd.concat(frames, ignore_index=True)
+        aberrations.insert(2, 'Date', aberrations['Period'].dt.to_timestamp())
+        return aberrations
+    
+    def get_flagged_periods(self, period_filter=None, period_type='monthly'):
+        """Flagged periods that fall inside a date window"""
+        aberrations = self.get_aberrations(period_type)
+        flagged = aberrations[aberrations['Flagged']]
+        
+        if period_filter is not None:
+            periods = self.get_period_table(period_filter, period_type)['Period']
+            flagged = flagged[flagged['Period'].isin(periods)]
+        
+        return flagged.reset_index(drop=True)
+    
+    @cached_result
+    def get_rolling_series(self, period_filter=None, windows=ROLLING_WINDOWS, use_completed=False):
+        """Rolling annualized incidence and cure rate for the months of a date window"""
+        monthly = self.get_period_table(None, 'monthly').set_index('Period')
+        
+        # Months without any cases count as zero
+        if len(monthly):
+            all_months = pd.period_range(monthly.index.min(), monthly.index.max(), freq='M')
+            monthly = monthly.reindex(all_months, fill_value=0)
+        
+        # Trailing sums come from cumulative sums over the whole history, so months
+        # at the start of a window still see the cases before it
+        counts = pd.DataFrame({
+            'cases': monthly['Cases'],
+            'new_relapse': monthly['New'] + monthly['Relapse'],
+            'cured': monthly['Cured'],
+            'cured_completed': monthly['CuredCompleted']
+        })
+        sums = get_rolling_sums('monthly').update(monthly.index, counts, windows)
+        
+        rolling = pd.DataFrame({'Period': monthly.index, 'Date': monthly.index.to_timestamp()})
+        cured_col = 'cured_completed' if use_completed else 'cured'
+        for months in windows:
+            window_sums = sums[months]
+            rolling[f'Incidence_{months}m'] = (
+                window_sums['new_relapse'].to_numpy() * 12 / months / self.rwanda_population * 100000
+            )
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cure_rate = window_sums[cured_col].to_numpy() / window_sums['cases'].to_numpy() * 100
+            rolling[f'Cure_rate_{months}m'] = np.where(window_sums['cases'].to_numpy() > 0, cure_rate, np.nan)
+        
+        # Keep the months that overlap the window
+        if period_filter is not None and len(rolling):
+            start_date, end_date = pd.Timestamp(period_filter[0]), pd.Timestamp(period_filter[1])
+            overlaps = (monthly.index.start_time <= end_date) & (monthly.index.end_time >= start_date)
+            rolling = rolling[overlaps]
+        
+        return rolling.reset_index(drop=True)
+    
+    def _aberration_trace(self, period_table, column, series, period_type):
+        """Marker trace highlighting flagged periods of a plotted series"""
+        import plotly.graph_objects as go
+        
+        aberrations = self.get_aberrations(period_type)
+        flagged = aberrations[(aberrations['Series'] == series) & aberrations['Flagged']]['Period']
+        points = period_table[period_table['Period'].isin(flagged)]
+        
+        if len(points) == 0:
+            return None
+        
+        return go.Scatter(
+            x=points['Date'],
+            y=points[column],
+            mode='markers',
+            name=f"{ABERRATION_SERIES[series]} flagged",
+            marker=dict(color=self.colors['aberration'], size=16, symbol='circle-open', line=dict(width=3))
+        )
+    
+    def _line_trace(self, dates, values, name, color, period_type):
+        """Build a time series trace, compact for high-resolution period types"""
+        import plotly.graph_objects as go
+        
+        if period_type not in HIGH_RESOLUTION_PERIODS:
+            return go.Scatter(
+                x=dates,
+                y=values,
+                mode='lines+markers',
+                name=name,
+                line=dict(color=color, width=3),
+                marker=dict(size=8)
+            )
+        
+        # Numeric arrays are sent as base64 typed arrays, so use the smallest dtype
+        values = values.to_numpy()
+        if np.issubdtype(values.dtype, np.integer) and len(values) and values.min() >= 0:
+            values = values.astype(np.min_scalar_type(values.max()))
+        else:
+            values = values.astype('float32')
+        
+        # Dates go as epoch milliseconds, which a date axis reads directly
+        epoch_ms = dates.to_numpy(dtype='datetime64[ms]').astype('int64').astype('float64')
+        return go.Scattergl(
+            x=epoch_ms,
+            y=values,
+            mode='lines+markers',
+            name=name,
+            line=dict(color=color, width=2),
+            marker=dict(size=4)
+        )
+    
+    @cached_result
+    def _latest_month_counts(self, period_filter=None):
+        """Outcome and high-risk counts for the latest month of a window"""
+        if self._polars is not None:
+            return self._polars.latest_month_counts(period_filter)
+        
         filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
         
-        # Get latest month data
         latest_month = filtered_df['YearMonth'].max()
         latest_data = filtered_df[filtered_df['YearMonth'] == latest_month]
         
+        return {
+            'month': latest_month,
+            'rows': len(latest_data),
+            'cured': int(latest_data['Is_Cured'].sum()),
+            'cured_completed': int(latest_data['Is_CuredCompleted'].sum()),
+            'high_risk': int(latest_data['High_Risk'].sum())
+        }
+    
+    @cached_result
+    def _under14_counts(self, period_filter=None):
+        """Under-14 cases and their new/relapse subset within a window"""
+        if self._polars is not None:
+            return self._polars.under14_counts(period_filter)
+        
+        filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
+        under_14 = filtered_df['Under14'] == True
+        
+        return {
+            'rows': int(under_14.sum()),
+            'new_relapse': int((under_14 & filtered_df['New_or_Relapse']).sum())
+        }
+    
+    def _pie_counts(self, counts):
+        """Order pie slices like value_counts, leaving out empty slices"""
+        pie_counts = pd.Series(counts)
+        return pie_counts[pie_counts > 0].sort_values(ascending=False, kind='stable')
+    
+    @cached_result
+    def create_treatment_outcome_pie(self, period_filter=None, use_completed=False):
+        """Create pie chart for treatment outcomes"""
+        import plotly.express as px
+        
+        # Get latest month data
+        latest = self._latest_month_counts(period_filter)
+        latest_month = latest['month']
+        
         if use_completed:
-            latest_data['Outcome'] = latest_data['Treatment outcome'].apply(
-                lambda x: 'Cured+Completed' if str(x).strip().lower() in ['cured', 'completed'] else 'Others'
-            )
+            pie_counts = self._pie_counts({
+                'Cured+Completed': latest['cured_completed'],
+                'Others': latest['rows'] - latest['cured_completed']
+            })
             title = f"Cured+Completed vs Others - {latest_month}"
         else:
-            latest_data['Outcome'] = latest_data['Treatment outcome'].apply(
-                lambda x: 'Cured' if str(x).strip().lower() == 'cured' else 'Others'
-            )
+            pie_counts = self._pie_counts({
+                'Cured': latest['cured'],
+                'Others': latest['rows'] - latest['cured']
+            })
             title = f"Cured vs Others - {latest_month}"
         
-        pie_counts = latest_data['Outcome'].value_counts()
-        
         fig = px.pie(
             values=pie_counts.values,
             names=pie_counts.index,
@@ -206,54 +1212,34 @@ class TBChartGenerator:
         
         return fig
     
+    @cached_result
     def create_treatment_time_series(self, period_filter=None, period_type='monthly', use_completed=False):
         """Create time series for treatment outcomes"""
-        filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
+        import plotly.graph_objects as go
         
-        # Group by period
-        group_col = 'YearMonth' if period_type == 'monthly' else 'Quarter'
+        monthly_counts = self.get_period_table(period_filter, period_type)
         
         if use_completed:
-            monthly_counts = filtered_df.groupby(group_col).agg(
-                Diagnosed=('Method of TB confirmation', 'count'),
-                CuredCompleted=('Is_CuredCompleted', 'sum')
-            ).reset_index()
             cured_col = 'CuredCompleted'
             cured_label = 'Cured+Completed'
         else:
-            monthly_counts = filtered_df.groupby(group_col).agg(
-                Diagnosed=('Method of TB confirmation', 'count'),
-                Cured=('Is_Cured', 'sum')
-            ).reset_index()
             cured_col = 'Cured'
             cured_label = 'Cured'
         
-        # Convert to datetime
-        monthly_counts['Date'] = monthly_counts[group_col].dt.to_timestamp()
-        
         fig = go.Figure()
         
-        fig.add_trace(go.Scatter(
-            x=monthly_counts['Date'],
-            y=monthly_counts['Diagnosed'],
-            mode='lines+markers',
-            name='Diagnosed',
-            line=dict(color=self.colors['diagnosed'], width=3),
-            marker=dict(size=8)
+        fig.add_trace(self._line_trace(
+            monthly_counts['Date'], monthly_counts['Diagnosed'], 'Diagnosed', self.colors['diagnosed'], period_type
         ))
         
-        fig.add_trace(go.Scatter(
-            x=monthly_counts['Date'],
-            y=monthly_counts[cured_col],
-            mode='lines+markers',
-            name=cured_label,
-            line=dict(color=self.colors['cured'], width=3),
-            marker=dict(size=8)
+        fig.add_trace(self._line_trace(
+            monthly_counts['Date'], monthly_counts[cured_col], cured_label, self.colors['cured'], period_type
         ))
         
         fig.update_layout(
             title=f"Diagnosed vs {cured_label} Patients Over Time",
             xaxis_title="Date",
+            xaxis_type='date',
             yaxis_title="Number of Patients",
             height=400,
             hovermode='x unified',
@@ -262,18 +1248,18 @@ class TBChartGenerator:
         
         return fig
     
+    @cached_result
     def create_high_risk_pie(self, period_filter=None):
         """Create pie chart for high-risk distribution"""
-        filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
+        import plotly.express as px
         
-        latest_month = filtered_df['YearMonth'].max()
-        latest_data = filtered_df[filtered_df['YearMonth'] == latest_month]
-        
-        latest_data['High_Risk_Label'] = latest_data['High_Risk'].apply(
-            lambda x: 'High Risk' if x else 'Others'
-        )
+        latest = self._latest_month_counts(period_filter)
+        latest_month = latest['month']
         
-        pie_counts = latest_data['High_Risk_Label'].value_counts()
+        pie_counts = self._pie_counts({
+            'High Risk': latest['high_risk'],
+            'Others': latest['rows'] - latest['high_risk']
+        })
         
         fig = px.pie(
             values=pie_counts.values,
@@ -288,42 +1274,32 @@ class TBChartGenerator:
         
         return fig
     
+    @cached_result
     def create_high_risk_time_series(self, period_filter=None, period_type='monthly'):
         """Create time series for high-risk cases"""
-        filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
-        
-        group_col = 'YearMonth' if period_type == 'monthly' else 'Quarter'
-        
-        monthly_counts = filtered_df.groupby(group_col).agg(
-            Diagnosed=('Method of TB confirmation', 'count'),
-            High_Risk=('High_Risk', 'sum')
-        ).reset_index()
+        import plotly.graph_objects as go
         
-        monthly_counts['Date'] = monthly_counts[group_col].dt.to_timestamp()
+        monthly_counts = self.get_period_table(period_filter, period_type)
         
         fig = go.Figure()
         
-        fig.add_trace(go.Scatter(
-            x=monthly_counts['Date'],
-            y=monthly_counts['Diagnosed'],
-            mode='lines+markers',
-            name='Diagnosed',
-            line=dict(color=self.colors['diagnosed'], width=3),
-            marker=dict(size=8)
+        fig.add_trace(self._line_trace(
+            monthly_counts['Date'], monthly_counts['Diagnosed'], 'Diagnosed', self.colors['diagnosed'], period_type
         ))
         
-        fig.add_trace(go.Scatter(
-            x=monthly_counts['Date'],
-            y=monthly_counts['High_Risk'],
-            mode='lines+markers',
-            name='High Risk',
-            line=dict(color=self.colors['high_risk'], width=3),
-            marker=dict(size=8)
+        fig.add_trace(self._line_trace(
+            monthly_counts['Date'], monthly_counts['High_Risk'], 'High Risk', self.colors['high_risk'], period_type
         ))
         
+        # Highlight periods flagged by aberration detection
+        flagged_trace = self._aberration_trace(monthly_counts, 'High_Risk', 'High_Risk', period_type)
+        if flagged_trace is not None:
+            fig.add_trace(flagged_trace)
+        
         fig.update_layout(
             title="Monthly Diagnosed vs High-Risk TB Cases",
             xaxis_title="Date",
+            xaxis_type='date',
             yaxis_title="Number of Patients",
             height=400,
             hovermode='x unified',
@@ -332,46 +1308,33 @@ class TBChartGenerator:
         
         return fig
     
+    @cached_result
     def create_notification_time_series(self, period_filter=None, period_type='monthly'):
         """Create time series for TB notifications"""
-        filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
-        
-        group_col = 'YearMonth' if period_type == 'monthly' else 'Quarter'
+        import plotly.graph_objects as go
         
-        monthly_notification = filtered_df.groupby(group_col).agg(
-            New=('New_Case', 'sum'),
-            Relapse=('Relapse_Case', 'sum')
-        ).reset_index()
-        
-        monthly_notification['Date'] = monthly_notification[group_col].dt.to_timestamp()
-        
-        # Calculate incidence per 100,000
-        monthly_notification['New_rate'] = monthly_notification['New'] / self.rwanda_population * 100000
-        monthly_notification['Relapse_rate'] = monthly_notification['Relapse'] / self.rwanda_population * 100000
+        monthly_notification = self.get_period_table(period_filter, period_type)
         
         fig = go.Figure()
         
-        fig.add_trace(go.Scatter(
-            x=monthly_notification['Date'],
-            y=monthly_notification['New_rate'],
-            mode='lines+markers',
-            name='New Case Rate',
-            line=dict(color=self.colors['new_cases'], width=3),
-            marker=dict(size=8)
+        fig.add_trace(self._line_trace(
+            monthly_notification['Date'], monthly_notification['New_rate'], 'New Case Rate', self.colors['new_cases'], period_type
         ))
         
-        fig.add_trace(go.Scatter(
-            x=monthly_notification['Date'],
-            y=monthly_notification['Relapse_rate'],
-            mode='lines+markers',
-            name='Relapse Case Rate',
-            line=dict(color=self.colors['relapse'], width=3),
-            marker=dict(size=8)
+        fig.add_trace(self._line_trace(
+            monthly_notification['Date'], monthly_notification['Relapse_rate'], 'Relapse Case Rate', self.colors['relapse'], period_type
         ))
         
+        # Highlight periods flagged by aberration detection
+        for column, series in [('New_rate', 'New'), ('Relapse_rate', 'Relapse')]:
+            flagged_trace = self._aberration_trace(monthly_notification, column, series, period_type)
+            if flagged_trace is not None:
+                fig.add_trace(flagged_trace)
+        
         fig.update_layout(
             title="TB Notification: Incidence per 100,000 Population",
             xaxis_title="Date",
+            xaxis_type='date',
             yaxis_title="Rate (/100,000)",
             height=400,
             hovermode='x unified',
@@ -380,21 +1343,143 @@ class TBChartGenerator:
         
         return fig
     
+    @cached_result
+    def create_rolling_trend_chart(self, period_filter=None, windows=ROLLING_WINDOWS, use_completed=False):
+        """Create rolling incidence and cure-rate trend chart"""
+        import plotly.graph_objects as go
+        
+        rolling = self.get_rolling_series(period_filter, windows, use_completed)
+        rate_name = "Treatment success" if use_completed else "Cure rate"
+        dashes = ['dot', 'dash', 'solid']
+        
+        fig = go.Figure()
+        
+        for i, months in enumerate(windows):
+            dash = dashes[i % len(dashes)]
+            fig.add_trace(go.Scatter(
+                x=rolling['Date'],
+                y=rolling[f'Incidence_{months}m'],
+                mode='lines',
+                name=f"Incidence ({months}-month)",
+                line=dict(color=self.colors['new_cases'], width=2, dash=dash)
+            ))
+            fig.add_trace(go.Scatter(
+                x=rolling['Date'],
+                y=rolling[f'Cure_rate_{months}m'],
+                mode='lines',
+                name=f"{rate_name} ({months}-month)",
+                line=dict(color=self.colors['cured'], width=2, dash=dash),
+                yaxis='y2'
+            ))
+        
+        fig.update_layout(
+            title="Rolling Incidence and Treatment Outcomes",
+            xaxis_title="Date",
+            yaxis=dict(title="Annualized incidence (/100,000)"),
+            yaxis2=dict(title=f"{rate_name} (%)", overlaying='y', side='right', range=[0, 100]),
+            height=400,
+            hovermode='x unified',
+            title_x=0.5
+        )
+        
+        return fig
+    
+    @cached_result
+    def create_target_heatmap(self, period_filter=None, period_type='monthly'):
+        """Create heatmap of target attainment per period and group"""
+        import plotly.graph_objects as go
+        
+        matrix = self.get_target_matrix(period_filter, period_type)
+        labels = matrix['Metric'] + ' – ' + matrix['Group']
+        row_order = list(dict.fromkeys(labels))
+        periods = matrix['Period'].astype(str)
+        
+        status = pd.crosstab(labels, periods, values=matrix['Status'], aggfunc='first').reindex(row_order)
+        values = pd.crosstab(labels, periods, values=matrix['Value'], aggfunc='first').reindex(row_order)
+        text = values.map(lambda value: '' if pd.isna(value) else f"{value:.0f}")
+        hover = status.map(lambda code: TARGET_STATUS_LABELS.get(code, 'No cases'))
+        
+        # Status codes -1..2 each get one band of a stepped colorscale
+        colors = [self.colors['others'], self.colors['target_good'],
+                  self.colors['target_warning'], self.colors['target_danger']]
+        colorscale = []
+        for i, color in enumerate(colors):
+            colorscale += [[i / len(colors), color], [(i + 1) / len(colors), color]]
+        
+        fig = go.Figure(go.Heatmap(
+            z=status.to_numpy(dtype=float),
+            x=list(status.columns),
+            y=row_order,
+            zmin=-1.5,
+            zmax=2.5,
+            colorscale=colorscale,
+            showscale=False,
+            text=text.to_numpy(),
+            texttemplate="%{text}",
+            customdata=hover.to_numpy(),
+            hovertemplate="%{y}<br>%{x}: %{text} (%{customdata})<extra></extra>",
+            xgap=2,
+            ygap=2
+        ))
+        
+        fig.update_layout(
+            title=f"Target Attainment by {'Month' if period_type == 'monthly' else 'Quarter'}",
+            xaxis_title="Period",
+            xaxis_type='category',
+            yaxis_autorange='reversed',
+            height=max(300, 40 * len(row_order) + 150),
+            title_x=0.5
+        )
+        
+        return fig
+    
+    @cached_result
+    def create_age_distribution_chart(self, period_filter=None, period_type='monthly', scheme='who'):
+        """Create stacked bar chart of cases per age band over time"""
+        import plotly.express as px
+        import plotly.graph_objects as go
+        
+        band_table = self.get_age_band_table(period_filter, period_type, scheme)
+        labels = age_band_labels(AGE_BAND_SCHEMES[scheme])
+        palette = px.colors.sequential.Blues[2:] + px.colors.sequential.Oranges[3:]
+        
+        fig = go.Figure()
+        
+        for i, label in enumerate(labels):
+            band = band_table[band_table['Band'] == label]
+            if band['Cases'].sum() == 0:
+                continue
+            fig.add_trace(go.Bar(
+                x=pd.PeriodIndex(band['Period']).to_timestamp() if len(band) else [],
+                y=band['Cases'],
+                name=label,
+                marker_color=self.colors['others'] if label == 'Unknown' else palette[i % len(palette)]
+            ))
+        
+        fig.update_layout(
+            title="TB Cases by Age Band Over Time",
+            xaxis_title="Date",
+            xaxis_type='date',
+            yaxis_title="Number of Patients",
+            barmode='stack',
+            height=400,
+            hovermode='x unified',
+            title_x=0.5
+        )
+        
+        return fig
+    
+    @cached_result
     def create_under14_pie(self, period_filter=None):
         """Create pie chart for under-14 TB cases"""
-        filtered_df = self._apply_period_filter(period_filter) if period_filter else self.df
-        
-        # Filter under 14
-        under_14_df = filtered_df[filtered_df['Under14'] == True]
+        import plotly.express as px
         
-        # Flag New OR Relapse cases
-        under_14_df = under_14_df.copy()
-        under_14_df['New_or_Relapse'] = under_14_df['Previous treatment history'].str.strip().str.lower().isin(['new', 'relapse'])
+        under_14 = self._under14_counts(period_filter)
         
         # Count groups
         case_counts = {
-            'New/Relapse': under_14_df['New_or_Relapse'].sum(),
-            'Other': len(under_14_df) - under_14_df['New_or_Relapse'].sum()
+            'New/Relapse': under_14['new_relapse'],
+            'Other': under_14['rows'] - under_14['new_relapse']
         }
         
         fig = px.pie(
@@ -0,0 +1,662 @@
+import argparse
+import importlib.util
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from collections import Counter
+from ingest import RecordStore
+from dataset import list_drops, load_dataset
+from aberration import AberrationDetector
+from charts import (TBChartGenerator, UNDER5_COLS, YES_NO_COLS, PERIOD_COLUMNS, AGE_BAND_SCHEMES,
+                    PERIOD_MONTHS, HIGH_RISK_GROUP_LABELS, ABERRATION_SERIES, ROLLING_WINDOWS, age_band_labels)
+
+DATE_COL = 'Enrollment date(Diagnostic Date)'
+
+# Columns the dashboard copes without; the rest are required
+OPTIONAL_COLUMNS = UNDER5_COLS + YES_NO_COLS + ['HIV status']
+
+def make_synthetic_line_list(rng, n_rows, drop_columns=()):
+    """Random line list with the surveillance columns and realistic dirty values"""
+    start = pd.Timestamp('2023-01-01') + pd.Timedelta(days=int(rng.integers(0, 365)))
+    span = int(rng.integers(1, 900))
+    dates = (start + pd.to_timedelta(rng.integers(0, span, n_rows), unit='D')).strftime('%Y-%m-%d')
+    dates = dates.to_numpy(dtype=object).copy()
+    dates[rng.random(n_rows) < 0.02] = 'not a date'
+    dates[rng.random(n_rows) < 0.01] = None
+
+    ages = rng.integers(-1, 100, n_rows).astype(object)
+    ages[rng.random(n_rows) < 0.03] = 'unknown'
+    ages[rng.random(n_rows) < 0.01] = 150
+
+    def yes_no():
+        return rng.choice(['Yes', 'No', ' yes', 'NO ', '', None], n_rows)
+
+    def contacts(high):
+        values = rng.integers(0, high, n_rows).astype(object)
+        values[rng.random(n_rows) < 0.02] = 'n/a'
+        values[rng.random(n_rows) < 0.02] = None
+        return values
+
+    df = pd.DataFrame({
+        DATE_COL: dates,
+        'Treatment outcome': rng.choice(
+            ['Cured', 'Completed', 'Died', 'Failed', 'Lost to follow-up', ' cured ', 'COMPLETED', 'Unknown', None],
+            n_rows),
+        'Previous treatment history': rng.choice(['New', 'Relapse', 'Other', ' new ', 'RELAPSE', None], n_rows),
+        'TB_Current age': ages,
+        'HIV status': rng.choice(['Positive', 'Negative', ' positive', None], n_rows),
+        'Method of TB confirmation': rng.choice(['Bacteriological', 'Clinical', None], n_rows),
+        UNDER5_COLS[0]: contacts(5),
+        UNDER5_COLS[1]: contacts(2),
+        UNDER5_COLS[2]: contacts(5)
+    })
+    for col in YES_NO_COLS:
+        df[col] = yes_no()
+
+    return df.drop(columns=list(drop_columns))
+
+def make_data_drops(rng, df, n_drops=3):
+    """Overlapping exports of a line list as raw text, with edited values and columns added or removed"""
+    df = df.astype(object).where(df.notna(), None)
+    df.insert(0, 'Case ID', [f"TB{i:05d}" for i in range(len(df))])
+    drops = []
+    for _ in range(n_drops):
+        rows = np.sort(rng.choice(len(df), size=int(rng.integers(1, len(df) + 1)), replace=False))
+        drop = df.iloc[rows].copy()
+        edited = rng.random(len(drop)) < 0.1
+        drop.loc[edited, 'Treatment outcome'] = 'Cured'
+        df.loc[drop.index[edited], 'Treatment outcome'] = 'Cured'
+        if rng.random() < 0.4:
+            drop['Region'] = rng.choice(['North', 'South', None], len(drop))
+        if rng.random() < 0.4:
+            drop = drop.drop(columns=[rng.choice(OPTIONAL_COLUMNS)], errors='ignore')
+        drops.append(drop.astype(str).where(drop.notna()).reset_index(drop=True))
+    return drops
+
+def reference_records(drops, key_columns):
+    """Records merged drop by drop and row by row: later values win, absent columns keep theirs"""
+    records = {}
+    for drop in drops:
+        for row in drop.to_dict('records'):
+            records.setdefault(tuple(row[col] for col in key_columns), {}).update(row)
+    return records
+
+def random_windows(rng, df, n_windows):
+    """Full range, empty, inverted, single-day and random date windows"""
+    dates = df[DATE_COL].dropna()
+    if len(dates) == 0:
+        return [None, (pd.Timestamp('2023-01-01'), pd.Timestamp('2023-12-31'))]
+
+    min_date, max_date = dates.min().normalize(), dates.max().normalize()
+    day = dates.iloc[int(rng.integers(0, len(dates)))].normalize()
+    windows = [
+        None,
+        (min_date, max_date),
+        (day, day),
+        (max_date + pd.Timedelta(days=30), max_date + pd.Timedelta(days=60)),
+        (max_date, min_date - pd.Timedelta(days=1))
+    ]
+    for _ in range(n_windows):
+        start = min_date + pd.Timedelta(days=int(rng.integers(-60, (max_date - min_date).days + 60)))
+        windows.append((start, start + pd.Timedelta(days=int(rng.integers(0, 400)))))
+    return windows
+
+def reference_period_table(gen, period_filter, period_type):
+    """Straightforward groupby over the filtered line list"""
+    filtered_df = gen._apply_period_filter(period_filter) if period_filter else gen.df
+    group_col = PERIOD_COLUMNS[period_type]
+    table = filtered_df.groupby(group_col).agg(
+        Cases=(group_col, 'size'),
+        Diagnosed=('Method of TB confirmation', 'count'),
+        Cured=('Is_Cured', 'sum'),
+        CuredCompleted=('Is_CuredCompleted', 'sum'),
+        High_Risk=('High_Risk', 'sum'),
+        New=('New_Case', 'sum'),
+        Relapse=('Relapse_Case', 'sum')
+    ).reset_index().rename(columns={group_col: 'Period'})
+    table['Date'] = table['Period'].dt.to_timestamp()
+    table['New_rate'] = table['New'] / gen.rwanda_population * 100000
+    table['Relapse_rate'] = table['Relapse'] / gen.rwanda_population * 100000
+    return table
+
+def reference_kpi_intervals(gen, period_filter, use_completed, n_resamples, seed, confidence=0.95):
+    """Bootstrap intervals from explicitly resampled rows, replaying the multinomial draws one resample at a time"""
+    filtered_df = gen._apply_period_filter(period_filter) if period_filter else gen.df
+    n = len(filtered_df)
+    if n == 0:
+        return None
+
+    # Rows are grouped by their bootstrap inputs in first-seen order, each group standing for its rows
+    cured_col = 'Is_CuredCompleted' if use_completed else 'Is_Cured'
+    if all(col in filtered_df.columns for col in UNDER5_COLS):
+        eligible = (filtered_df[UNDER5_COLS[0]] - filtered_df[UNDER5_COLS[1]]).clip(lower=0)
+        completed = filtered_df[UNDER5_COLS[2]]
+    else:
+        eligible = completed = pd.Series(0.0, index=filtered_df.index)
+    keys = list(zip(eligible.astype(float), completed.astype(float), filtered_df[cured_col].astype(float),
+                    filtered_df['New_or_Relapse'].astype(float)))
+    first_rows = {}
+    for position, key in enumerate(keys):
+        first_rows.setdefault(key, position)
+    group_sizes = Counter(keys)
+    positions = np.array(list(first_rows.values()))
+    probabilities = np.array([group_sizes[key] for key in first_rows]) / n
+
+    months_span = max(1, (filtered_df[DATE_COL].max() - filtered_df[DATE_COL].min()).days / 30.44)
+    incidence_factor = 12 / months_span / gen.rwanda_population * 100000
+
+    def statistics(rows):
+        return {
+            'ltbi_coverage': gen._calculate_ltbi_coverage(rows),
+            'cure_rate': rows[cured_col].sum() / n * 100,
+            'yearly_incidence': rows['New_or_Relapse'].sum() * incidence_factor
+        }
+
+    rng = np.random.default_rng(seed)
+    resampled = [statistics(filtered_df.iloc[np.repeat(positions, rng.multinomial(n, probabilities))])
+                 for _ in range(n_resamples)]
+    estimates = statistics(filtered_df)
+
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for key, estimate in estimates.items():
+        low, high = np.percentile([stats[key] for stats in resampled], [tail, 100 - tail])
+        intervals[key] = {'estimate': round(float(estimate), 1), 'low': round(float(low), 1),
+                          'high': round(float(high), 1)}
+    intervals['resamples'] = n_resamples
+    return intervals
+
+def reference_aberrations(counts, baseline=7, lag=2, c2_threshold=3.0, cusum_k=0.5, cusum_h=4.0, min_sd=0.5):
+    """EARS C2 and CUSUM recomputed over the whole series, one period at a time"""
+    rows = []
+    level = 0.0
+    for i, count in enumerate(counts):
+        expected = c2 = np.nan
+        if i >= baseline + lag:
+            base = counts[i - lag - baseline:i - lag]
+            expected = base.mean()
+            c2 = (count - expected) / max(base.std(ddof=1), min_sd)
+        if level > cusum_h:
+            level = 0.0
+        level = 0.0 if np.isnan(c2) else max(0.0, level + c2 - cusum_k)
+        rows.append((count, expected, c2, level, bool(c2 > c2_threshold or level > cusum_h)))
+    return pd.DataFrame(rows, columns=['Count', 'Expected', 'C2', 'CUSUM', 'Flagged'])
+
+def make_count_updates(rng, n_periods):
+    """Successive full count series as a detector sees them: growing, revised in place and cut back"""
+    counts = rng.poisson(rng.uniform(0.5, 30), n_periods).astype(float)
+    counts[rng.random(n_periods) < 0.05] *= 4
+    updates = [counts[:length] for length in sorted(rng.integers(0, n_periods + 1, 4))] + [counts]
+    revised = counts.copy()
+    revised[int(rng.integers(0, n_periods))] += 10
+    updates += [revised, revised[:max(0, n_periods - int(rng.integers(1, 5)))], counts]
+    return updates
+
+def window_calls(gen, period_filter, period_type, use_completed):
+    """The dashboard's figure and KPI calls for one window"""
+    return {
+        'flagged_periods': lambda: gen.get_flagged_periods(period_filter, period_type),
+        'kpi_comparison': lambda: gen.get_big_numbers_comparison(period_filter),
+        'kpi_intervals': lambda: gen.get_kpi_intervals(period_filter, use_completed, n_resamples=200,
+                                                       time_budget=np.inf),
+        'pie_fig': lambda: gen.create_treatment_outcome_pie(period_filter, use_completed),
+        'time_fig': lambda: gen.create_treatment_time_series(period_filter, period_type, use_completed),
+        'hr_pie_fig': lambda: gen.create_high_risk_pie(period_filter),
+        'hr_time_fig': lambda: gen.create_high_risk_time_series(period_filter, period_type),
+        'notification_fig': lambda: gen.create_notification_time_series(period_filter, period_type),
+        'rolling_fig': lambda: gen.create_rolling_trend_chart(period_filter, ROLLING_WINDOWS, use_completed),
+        'notification_counts': lambda: gen.get_notification_counts(period_filter),
+        'under14_fig': lambda: gen.create_under14_pie(period_filter),
+        'age_fig': lambda: gen.create_age_distribution_chart(period_filter, period_type),
+        'age_kpis': lambda: gen.get_age_band_kpis(period_filter),
+        'target_matrices': lambda: {period: gen.get_target_matrix(period_filter, period) for period in PERIOD_MONTHS}
+    }
+
+def comparable(result):
+    """A figure or KPI result as plain data, without timings"""
+    if isinstance(result, dict):
+        return {key: comparable(value) for key, value in result.items() if key != 'elapsed'}
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.to_json(date_format='iso', default_handler=str)
+    if hasattr(result, 'to_plotly_json'):
+        return result.to_json()
+    return repr(result)
+
+def reference_notification_counts(gen, period_filter):
+    """Latest-month new and relapse counts against the same days of the month before, from row filters"""
+    filtered_df = gen._apply_period_filter(period_filter) if period_filter else gen.df
+    if len(filtered_df) == 0:
+        return None
+    dates = gen.df[DATE_COL].dt.normalize()
+    last_day = filtered_df[DATE_COL].max().normalize()
+    first_day = last_day.replace(day=1)
+    if period_filter is not None:
+        first_day = max(first_day, pd.Timestamp(period_filter[0]).normalize())
+    previous_days = dates.dt.to_period('M') == last_day.to_period('M') - 1
+    latest = filtered_df[filtered_df[DATE_COL].dt.normalize() >= first_day]
+    previous = gen.df[previous_days & (dates.dt.day >= first_day.day) & (dates.dt.day <= last_day.day)]
+    return {
+        'month': last_day.to_period('M'),
+        'new': int(latest['New_Case'].sum()),
+        'relapse': int(latest['Relapse_Case'].sum()),
+        'new_delta': int(latest['New_Case'].sum() - previous['New_Case'].sum()),
+        'relapse_delta': int(latest['Relapse_Case'].sum() - previous['Relapse_Case'].sum())
+    }
+
+def reference_line_list(df, period_filter):
+    """Loaded rows with a parseable date inside the window, values untouched"""
+    dates = pd.to_datetime(df[DATE_COL], errors='coerce')
+    keep = dates.notna()
+    if period_filter is not None:
+        start_date, end_date = period_filter
+        keep &= (dates >= start_date) & (dates <= end_date)
+    return df[keep]
+
+def reference_pies(gen, period_filter):
+    """Latest-month outcome and high-risk splits and the under-14 split, row by row"""
+    filtered_df = gen._apply_period_filter(period_filter) if period_filter else gen.df
+    latest_month = filtered_df['YearMonth'].max()
+    latest_data = filtered_df[filtered_df['YearMonth'] == latest_month]
+    outcome = latest_data['Treatment outcome'].apply(lambda x: str(x).strip().lower())
+
+    under_14_df = filtered_df[filtered_df['Under14'] == True]
+    new_or_relapse = under_14_df['Previous treatment history'].str.strip().str.lower().isin(['new', 'relapse'])
+
+    return {
+        'month': str(latest_month),
+        'cured': outcome.map(lambda x: 'Cured' if x == 'cured' else 'Others').value_counts().to_dict(),
+        'cured_completed': outcome.map(
+            lambda x: 'Cured+Completed' if x in ['cured', 'completed'] else 'Others'
+        ).value_counts().to_dict(),
+        'high_risk': latest_data['High_Risk'].map(
+            lambda x: 'High Risk' if x else 'Others'
+        ).value_counts().to_dict(),
+        'under14': {
+            'New/Relapse': int(new_or_relapse.sum()),
+            'Other': int(len(under_14_df) - new_or_relapse.sum())
+        }
+    }
+
+def reference_age_bands(gen, period_filter, period_type, scheme):
+    """Per-period band counts from pd.cut and a groupby"""
+    filtered_df = gen._apply_period_filter(period_filter) if period_filter else gen.df
+    edges = AGE_BAND_SCHEMES[scheme]
+    labels = age_band_labels(edges)
+    age = filtered_df['TB_Current age'].where(filtered_df['TB_Current age'] <= 120)
+    bands = pd.cut(age, edges + [np.inf], right=False, labels=labels[:-1]).astype(object).fillna('Unknown')
+    return filtered_df.groupby([filtered_df[PERIOD_COLUMNS[period_type]], bands]).size().to_dict()
+
+def reference_rolling(gen, period_filter, months, use_completed):
+    """Rolling incidence and cure rate from pandas rolling sums over the monthly groupby"""
+    monthly = reference_period_table(gen, None, 'monthly').set_index('Period')
+    if len(monthly):
+        monthly = monthly.reindex(pd.period_range(monthly.index.min(), monthly.index.max(), freq='M'),
+                                  fill_value=0)
+    sums = monthly[['Cases', 'Cured', 'CuredCompleted', 'New', 'Relapse']].rolling(months).sum()
+    cured = sums['CuredCompleted' if use_completed else 'Cured']
+    rolling = pd.DataFrame({
+        'Incidence': (sums['New'] + sums['Relapse']) * 12 / months / gen.rwanda_population * 100000,
+        'Cure_rate': (cured / sums['Cases'] * 100).where(sums['Cases'] > 0)
+    })
+    if period_filter is not None:
+        start_date, end_date = period_filter
+        rolling = rolling[(rolling.index.start_time <= end_date) & (rolling.index.end_time >= start_date)]
+    return rolling
+
+def reference_status(value, target, target_type):
+    """Scalar target status, following the dashboard's target indicator thresholds"""
+    if np.isnan(value):
+        return -1
+    if target_type == "higher_better":
+        return 0 if value >= target else 1 if value >= target * 0.8 else 2
+    return 0 if value <= target else 1 if value <= target * 1.2 else 2
+
+def reference_target_matrix(gen, period_filter, period_type):
+    """Coverage per period and group, and incidence per period, one group at a time"""
+    filtered_df = gen._apply_period_filter(period_filter) if period_filter else gen.df
+    group_cols = [col for col in YES_NO_COLS if col in filtered_df.columns] + ['HIV_Positive', 'Under15', 'Above65']
+    records = {}
+    for period, period_df in filtered_df.groupby(PERIOD_COLUMNS[period_type]):
+        for col in [None] + group_cols:
+            group_df = period_df if col is None else period_df[period_df[col] == True]
+            coverage = np.nan
+            if all(c in group_df.columns for c in UNDER5_COLS):
+                eligible = (group_df[UNDER5_COLS[0]] - group_df[UNDER5_COLS[1]]).clip(lower=0).sum()
+                if eligible > 0:
+                    coverage = min(group_df[UNDER5_COLS[2]].sum() / eligible * 100, 100)
+            group = 'All cases' if col is None else HIGH_RISK_GROUP_LABELS.get(col, col.strip())
+            records[('LTBI coverage', group, str(period))] = (coverage, reference_status(coverage, 90, "higher_better"))
+        incidence = (period_df['New_or_Relapse'].sum() * 12 / PERIOD_MONTHS[period_type]
+                     / gen.rwanda_population * 100000)
+        # Days of the period inside both the data and the window
+        days = pd.date_range(period.start_time, period.end_time.normalize())
+        covered = (days >= gen.df[DATE_COL].min().normalize()) & (days <= gen.df[DATE_COL].max().normalize())
+        if period_filter is not None:
+            covered &= (days >= pd.Timestamp(period_filter[0]).normalize()) & (days <= period_filter[1])
+        incidence = incidence * len(days) / covered.sum()
+        records[('Yearly incidence', 'All cases', str(period))] = (incidence, reference_status(incidence, 46, "lower_better"))
+    return records
+
+def trace_series(trace):
+    """Dates and values of a time series trace, whatever its encoding"""
+    x = np.asarray(trace.x)
+    dates = pd.to_datetime(x, unit='ms') if np.issubdtype(x.dtype, np.number) else pd.to_datetime(x)
+    return list(dates), [float(v) for v in np.asarray(trace.y)]
+
+def pie_slices(fig):
+    """Pie slices as a label -> value dict"""
+    trace = fig.data[0]
+    return {label: int(value) for label, value in zip(trace.labels, trace.values)}
+
+class DifferentialChecker:
+    """Compares optimized generator paths with reference computations"""
+
+    def __init__(self):
+        self.checks = 0
+        self.failures = []
+
+    def expect(self, condition, context):
+        self.checks += 1
+        if not condition:
+            self.failures.append(context)
+
+    def expect_frame(self, left, right, context):
+        try:
+            pd.testing.assert_frame_equal(
+                left.reset_index(drop=True), right.reset_index(drop=True), check_dtype=False, check_exact=True
+            )
+            self.expect(True, context)
+        except AssertionError as e:
+            self.expect(False, f"{context}: {e}")
+
+    def check_window(self, gen, period_filter, context):
+        # Big numbers: reference get_big_numbers vs the cumulative timeline
+        reference = gen.get_big_numbers(period_filter)
+        self.expect(gen._kpis_from_totals(gen._window_totals(period_filter)) == reference,
+                    f"{context} big numbers")
+
+        filtered_df = gen._apply_period_filter(period_filter) if period_filter else gen.df
+        comparison = gen.get_big_numbers_comparison(period_filter)
+        self.expect(comparison['current'] == reference, f"{context} comparison current")
+        for key in ('previous_period', 'last_year'):
+            window = comparison[key]['window']
+            self.expect(comparison[key]['kpis'] == gen.get_big_numbers(window), f"{context} {key} kpis")
+
+        # Bootstrap point estimates match the straightforward KPI helpers
+        intervals = gen.get_kpi_intervals(period_filter, n_resamples=50)
+        if intervals is None:
+            self.expect(len(filtered_df) == 0, f"{context} intervals missing")
+        else:
+            self.expect(
+                intervals['ltbi_coverage']['estimate'] == round(gen._calculate_ltbi_coverage(filtered_df), 1),
+                f"{context} ltbi estimate")
+            self.expect(
+                intervals['yearly_incidence']['estimate'] == round(gen._calculate_yearly_incidence(filtered_df), 1),
+                f"{context} incidence estimate")
+
+        # Bootstrap intervals: the same draws over explicitly resampled rows, and the same result per seed
+        for use_completed, seed in ((False, 0), (True, 7)):
+            intervals = gen.get_kpi_intervals(period_filter, use_completed, n_resamples=30,
+                                              time_budget=np.inf, seed=seed)
+            expected = reference_kpi_intervals(gen, period_filter, use_completed, 30, seed)
+            self.expect(comparable(intervals) == comparable(expected),
+                        f"{context} intervals (completed={use_completed})")
+            repeated = gen.get_kpi_intervals(period_filter, use_completed, n_resamples=30,
+                                             time_budget=np.inf, seed=seed)
+            self.expect(comparable(repeated) == comparable(intervals), f"{context} intervals seed")
+            if intervals is not None:
+                self.expect(all(intervals[key]['low'] <= intervals[key]['high']
+                                for key in ('ltbi_coverage', 'cure_rate', 'yearly_incidence')),
+                            f"{context} interval bounds")
+
+        # Line list export: source values, not the coerced preprocessing columns
+        exported = pd.concat(list(gen.iter_line_list(period_filter, chunk_size=100)))
+        self.expect_frame(exported, reference_line_list(gen._source_df, period_filter),
+                          f"{context} line list export")
+
+        # Notification cards: latest month against the same days of the month before
+        counts = gen.get_notification_counts(period_filter)
+        expected = reference_notification_counts(gen, period_filter)
+        self.expect(counts == expected if counts is None or expected is None else
+                    {key: counts[key] for key in expected} == expected, f"{context} notification counts")
+
+        # Pies
+        pies = reference_pies(gen, period_filter)
+        self.expect(pie_slices(gen.create_treatment_outcome_pie(period_filter, False)) == pies['cured'],
+                    f"{context} outcome pie")
+        self.expect(pie_slices(gen.create_treatment_outcome_pie(period_filter, True)) == pies['cured_completed'],
+                    f"{context} outcome pie (completed)")
+        self.expect(pie_slices(gen.create_high_risk_pie(period_filter)) == pies['high_risk'],
+                    f"{context} high-risk pie")
+        self.expect(pie_slices(gen.create_under14_pie(period_filter)) == pies['under14'],
+                    f"{context} under-14 pie")
+        self.expect(gen.create_high_risk_pie(period_filter).layout.title.text.endswith(pies['month']),
+                    f"{context} pie month")
+
+        # Period tables and the traces drawn from them
+        for period_type in PERIOD_COLUMNS:
+            table = reference_period_table(gen, period_filter, period_type)
+            self.expect_frame(gen.get_period_table(period_filter, period_type)[table.columns], table,
+                              f"{context} {period_type} period table")
+
+            expected = {
+                'Diagnosed': (list(table['Date']), [float(v) for v in table['Diagnosed']]),
+                'Cured': (list(table['Date']), [float(v) for v in table['Cured']]),
+                'Cured+Completed': (list(table['Date']), [float(v) for v in table['CuredCompleted']]),
+                'High Risk': (list(table['Date']), [float(v) for v in table['High_Risk']])
+            }
+            figures = [
+                gen.create_treatment_time_series(period_filter, period_type, False),
+                gen.create_treatment_time_series(period_filter, period_type, True),
+                gen.create_high_risk_time_series(period_filter, period_type)
+            ]
+            for fig in figures:
+                for trace in fig.data[:2]:
+                    self.expect(trace_series(trace) == expected[trace.name],
+                                f"{context} {period_type} {trace.name} trace")
+
+            notification = gen.create_notification_time_series(period_filter, period_type)
+            for trace, column in zip(notification.data[:2], ['New_rate', 'Relapse_rate']):
+                dates, values = trace_series(trace)
+                rates = table[column].to_numpy(dtype=float)
+                if period_type in ('weekly', 'daily'):
+                    rates = rates.astype('float32').astype(float)
+                self.expect(dates == list(table['Date']) and values == list(rates),
+                            f"{context} {period_type} {trace.name} trace")
+
+        # Rolling trends: incremental cumulative sums vs pandas rolling
+        for use_completed in (False, True):
+            rolling = gen.get_rolling_series(period_filter, use_completed=use_completed)
+            for months in (3, 6, 12):
+                expected = reference_rolling(gen, period_filter, months, use_completed)
+                self.expect(
+                    list(rolling['Period']) == list(expected.index) and
+                    np.allclose(rolling[f'Incidence_{months}m'], expected['Incidence'], equal_nan=True) and
+                    np.allclose(rolling[f'Cure_rate_{months}m'], expected['Cure_rate'], equal_nan=True),
+                    f"{context} {months}-month rolling series")
+
+        # Target matrix: bincount cells vs one groupby per period and group
+        for period_type in PERIOD_MONTHS:
+            matrix = gen.get_target_matrix(period_filter, period_type)
+            expected = reference_target_matrix(gen, period_filter, period_type)
+            matches = len(matrix) == len(expected)
+            for row in matrix.itertuples():
+                value, status = expected.get((row.Metric, row.Group, str(row.Period)), (np.nan, None))
+                same_value = np.isnan(value) and np.isnan(row.Value) or np.isclose(value, row.Value)
+                matches = matches and status == row.Status and same_value
+            self.expect(matches, f"{context} {period_type} target matrix")
+
+        # Age bands: bincount folding vs pd.cut + groupby
+        for scheme in AGE_BAND_SCHEMES:
+            bands = gen.get_age_band_table(period_filter, 'monthly', scheme)
+            counts = {(period, band): cases for period, band, cases in
+                      zip(bands['Period'], bands['Band'], bands['Cases']) if cases}
+            self.expect(counts == reference_age_bands(gen, period_filter, 'monthly', scheme),
+                        f"{context} {scheme} age bands")
+
+    def expect_records(self, store, drops, context):
+        """Records of a store keyed by case ID against merging the drops row by row"""
+        expected = reference_records(drops, ['Case ID'])
+        stored = {row['Case ID']: row for row in store.data.to_dict('records')}
+        self.expect(
+            len(stored) == len(store.data) == len(expected) and all(
+                all(pd.isna(stored[key].get(col)) if pd.isna(value) else stored[key].get(col) == value
+                    for col, value in record.items())
+                for (key,), record in expected.items()
+            ), context)
+
+    def check_ingest(self, drops, context):
+        """Deduplicate drops with and without a record key"""
+        keyed = RecordStore(['Case ID'])
+        for drop in drops:
+            keyed.ingest(drop)
+        self.expect_records(keyed, drops, f"{context} keyed ingest")
+
+        # Cached loads: a drop named after the cached ones is ingested on top of the cache,
+        # one named before them (a backfilled export) still loses to the later drops
+        with tempfile.TemporaryDirectory() as data_dir:
+            cache_dir = os.path.join(data_dir, "cache")
+            for step, index in enumerate([1, 2, 0]):
+                drops[index].to_csv(os.path.join(data_dir, f"drop_{index}.csv"), index=False, encoding="latin1")
+                written = [pd.read_csv(path, encoding="latin1", dtype=str) for path in list_drops(data_dir)]
+                store = load_dataset(data_dir, ['Case ID'], cache_dir)
+                self.expect_records(store, written, f"{context} cached load {step} (drop {index})")
+
+        # Without a key, the same rows in a later drop are duplicates whatever its columns
+        unkeyed = RecordStore()
+        unkeyed.ingest(drops[0])
+        widened = drops[0].assign(Extra=None).astype(str).where(lambda df: df.notna())
+        counts = unkeyed.ingest(widened)
+        self.expect(counts['duplicates'] == len(drops[0]) and counts['new_records'] == 0, f"{context} widened drop")
+        narrowed = drops[0].drop(columns=[drops[0].columns[-1]])
+        counts = unkeyed.ingest(narrowed)
+        self.expect(counts['duplicates'] == len(drops[0]) and counts['new_records'] == 0, f"{context} narrowed drop")
+        self.expect(unkeyed.get_report()['schema_changes'] == 2 and len(unkeyed.data) == len(drops[0]),
+                    f"{context} unkeyed schema report")
+
+    def check_aberrations(self, gen, context):
+        """Incrementally updated detector flags against a recompute over the whole history"""
+        for period_type in PERIOD_COLUMNS:
+            aberrations = gen.get_aberrations(period_type)
+            table = reference_period_table(gen, None, period_type).set_index('Period')
+            if len(table):
+                table = table.reindex(pd.period_range(table.index.min(), table.index.max(),
+                                                      freq=table.index.freq), fill_value=0)
+            for series in ABERRATION_SERIES:
+                rows = aberrations[aberrations['Series'] == series]
+                self.expect(list(rows['Period']) == list(table.index), f"{context} {period_type} {series} periods")
+                expected = reference_aberrations(table[series].to_numpy(dtype=float))
+                self.expect_frame(rows[expected.columns], expected, f"{context} {period_type} {series} aberrations")
+
+    def check_aberration_updates(self, rng, context):
+        """A detector fed growing, revised and shortened series against a recompute of each series"""
+        detector = AberrationDetector()
+        for updates, freq in ((make_count_updates(rng, int(rng.integers(1, 60))), 'M'),
+                              (make_count_updates(rng, int(rng.integers(1, 30))), 'Q')):
+            for step, counts in enumerate(updates):
+                periods = pd.period_range('2020-01', periods=len(counts), freq=freq)
+                result = detector.update(periods, counts)
+                self.expect(list(result['Period']) == list(periods), f"{context} {freq} update {step} periods")
+                expected = reference_aberrations(counts)
+                self.expect_frame(result[expected.columns], expected, f"{context} {freq} update {step}")
+
+    def check_concurrency(self, df, windows, context):
+        """Figures and KPIs built on the thread pool against the same calls run in turn"""
+        # Separate data versions keep the two generators from sharing cached results
+        generators = {parallel: TBChartGenerator(df, data_version=f"{context} parallel={parallel}")
+                      for parallel in (False, True)}
+        for window in windows:
+            for period_type, use_completed in (('monthly', False), ('quarterly', True)):
+                results = {
+                    parallel: gen.run_concurrently(window_calls(gen, window, period_type, use_completed), window,
+                                                   (period_type,) + tuple(PERIOD_MONTHS), parallel=parallel)[0]
+                    for parallel, gen in generators.items()
+                }
+                for name, result in results[False].items():
+                    self.expect(comparable(results[True][name]) == comparable(result),
+                                f"{context} window {window} {period_type} parallel {name}")
+
+    def check_engines(self, gen, other, period_filter, context):
+        """Compare the results of two engines over the same data"""
+        self.expect(other._kpis_from_totals(other._window_totals(period_filter)) ==
+                    gen._kpis_from_totals(gen._window_totals(period_filter)), f"{context} engine big numbers")
+        self.expect(str(other._latest_month_counts(period_filter)) == str(gen._latest_month_counts(period_filter)),
+                    f"{context} engine latest month")
+        self.expect(other._under14_counts(period_filter) == gen._under14_counts(period_filter),
+                    f"{context} engine under-14")
+        for period_type in PERIOD_COLUMNS:
+            self.expect_frame(other.get_period_table(period_filter, period_type),
+                              gen.get_period_table(period_filter, period_type),
+                              f"{context} engine {period_type} period table")
+            expected = gen._age_year_counts(period_filter, period_type)
+            actual = other._age_year_counts(period_filter, period_type)
+            self.expect(list(actual['periods']) == list(expected['periods']) and all(
+                np.array_equal(actual[key], expected[key]) for key in ('cases', 'new_relapse', 'cured')),
+                f"{context} engine {period_type} age counts")
+            if period_type in ('monthly', 'quarterly'):
+                self.expect_frame(other.get_target_matrix(period_filter, period_type),
+                                  gen.get_target_matrix(period_filter, period_type),
+                                  f"{context} engine {period_type} target matrix")
+        # Timings aside, both engines draw the same resamples from the same distinct rows
+        expected, actual = (engine.get_kpi_intervals(period_filter, n_resamples=200) for engine in (gen, other))
+        expected, actual = ({key: value for key, value in result.items() if key != 'elapsed'} if result else result
+                            for result in (expected, actual))
+        self.expect(actual == expected, f"{context} engine intervals")
+        self.expect(np.array_equal(other._period_positions(period_filter), gen._period_positions(period_filter)),
+                    f"{context} engine window rows")
+
+    def check_engine_preparation(self, gen, other, context):
+        """Compare the validated frames and quality reports of two engines"""
+        self.expect(str(other.get_quality_report()) == str(gen.get_quality_report()), f"{context} engine quality report")
+        self.expect(np.array_equal(other._source_positions, gen._source_positions), f"{context} engine kept rows")
+        self.expect_frame(other.df[gen.df.columns], gen.df, f"{context} engine prepared frame")
+
+def run(n_datasets=10, n_windows=10, seed=0, engines=True):
+    """Run the differential checks and return the checker with its results"""
+    rng = np.random.default_rng(seed)
+    checker = DifferentialChecker()
+
+    if importlib.util.find_spec('polars') is None:
+        engines = False
+
+    for dataset in range(n_datasets):
+        n_rows = int(rng.choice([1, 25, 500, 3000]))
+        optional = np.array(OPTIONAL_COLUMNS, dtype=object)
+        dropped = list(optional[rng.random(len(optional)) < 0.2])
+        df = make_synthetic_line_list(rng, n_rows, dropped)
+
+        gen = TBChartGenerator(df)
+        other = TBChartGenerator(df, engine='polars') if engines else None
+        checker.check_ingest(make_data_drops(rng, df), f"dataset {dataset} ({n_rows} rows) drops")
+        checker.check_aberrations(gen, f"dataset {dataset} ({n_rows} rows)")
+        checker.check_aberration_updates(rng, f"dataset {dataset} detector")
+        if other is not None:
+            checker.check_engine_preparation(gen, other, f"dataset {dataset} ({n_rows} rows)")
+
+        windows = random_windows(rng, gen.df, n_windows)
+        checker.check_concurrency(df, windows[:3], f"dataset {dataset} ({n_rows} rows)")
+        for window in windows:
+            context = f"dataset {dataset} ({n_rows} rows, dropped {dropped}) window {window}"
+            checker.check_window(gen, window, context)
+            if other is not None:
+                checker.check_engines(gen, other, window, context)
+
+    return checker
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential checks for TBChartGenerator fast paths")
+    parser.add_argument('--datasets', type=int, default=10, help="number of random datasets")
+    parser.add_argument('--windows', type=int, default=10, help="random windows per dataset")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--no-engines', action='store_true', help="skip the pandas vs Polars comparison")
+    args = parser.parse_args()
+
+    checker = run(args.datasets, args.windows, args.seed, not args.no_engines)
+    for failure in checker.failures[:20]:
+        print(f"FAIL {failure}")
+    print(f"{checker.checks - len(checker.failures)}/{checker.checks} checks passed")
+    raise SystemExit(1 if checker.failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import io
+import pandas as pd
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def _prepare_chunk(chunk):
+    """Give every chunk the same column types so the export schema stays stable"""
+    chunk = chunk.copy()
+    for col in chunk.columns:
+        if isinstance(chunk[col].dtype, pd.PeriodDtype):
+            chunk[col] = chunk[col].astype(str)
+        elif chunk[col].dtype == object or pd.api.types.is_string_dtype(chunk[col]):
+            chunk[col] = chunk[col].astype('string')
+    return chunk
+
+def iter_csv(chunks):
+    """Yield CSV bytes chunk by chunk, writing the header only once"""
+    header = True
+    for chunk in chunks:
+        yield _prepare_chunk(chunk).to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+def iter_parquet(chunks):
+    """Yield Parquet bytes with one row group per chunk"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    buffer = io.BytesIO()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(_prepare_chunk(chunk), preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(buffer, table.schema)
+        writer.write_table(table.cast(writer.schema))
+
+        # Hand over what has been written so far and reuse the buffer
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if writer is not None:
+        writer.close()
+        yield buffer.getvalue()
+
+def iter_export(chunks, fmt):
+    """Yield export bytes for a sequence of DataFrame chunks"""
+    if fmt == 'csv':
+        return iter_csv(chunks)
+    if fmt == 'parquet':
+        return iter_parquet(chunks)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+def build_export(chunks, fmt):
+    """Build a whole export file in memory, converting the DataFrame chunks one at a time"""
+    buffer = io.BytesIO()
+    for data in iter_export(chunks, fmt):
+        buffer.write(data)
+    return buffer.getvalue()
@@ -0,0 +1,171 @@
+import hashlib
+import numpy as np
+import pandas as pd
+
+def _hash_rows(df):
+    """Stable 64-bit hash of each row's values, independent of column order"""
+    return pd.util.hash_pandas_object(df[sorted(df.columns)], index=False).to_numpy()
+
+class RecordStore:
+    """Deduplicated line list built from data drops, with a hash index over record identities"""
+
+    def __init__(self, key_columns=None):
+        self.key_columns = list(key_columns or [])
+        self.drops = {}
+        self.data = pd.DataFrame()
+        self.report = {'drops': 0, 'rows_read': 0, 'new_records': 0, 'duplicates': 0, 'updates': 0,
+                       'schema_changes': 0, 'columns_added': [], 'columns_missing': []}
+
+        # Without a key, records are identified by the columns every drop so far has had
+        self.identity_columns = None
+
+        self._record_hashes = np.array([], dtype=np.uint64)
+        self._content_hashes = np.array([], dtype=np.uint64)
+        self._index = None
+
+    def __getstate__(self):
+        # The hash table is rebuilt on first lookup rather than pickled
+        state = dict(self.__dict__)
+        state['_index'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Stores cached before schema tracking identified records by all their columns
+        state.setdefault('identity_columns', list(state['data'].columns) or None)
+        for key, value in {'schema_changes': 0, 'columns_added': [], 'columns_missing': []}.items():
+            state['report'].setdefault(key, value)
+        self.__dict__.update(state)
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = pd.Index(self._record_hashes)
+        return self._index
+
+    def _record_identity(self, df):
+        """Hash identifying each row's record: its key columns, or its identity columns' content"""
+        if self.key_columns:
+            missing = [col for col in self.key_columns if col not in df.columns]
+            if missing:
+                raise ValueError(f"Record key columns missing from data drop: {', '.join(missing)}")
+            return _hash_rows(df[self.key_columns])
+
+        # Without a key, identical rows are the same record; numbering repeats keeps
+        # identical cases within one drop apart while still matching them across drops
+        content = _hash_rows(df[self.identity_columns])
+        occurrence = pd.Series(content).groupby(content).cumcount().to_numpy()
+        return pd.util.hash_pandas_object(
+            pd.DataFrame({'content': content, 'occurrence': occurrence}), index=False
+        ).to_numpy()
+
+    def _align_schema(self, drop):
+        """Bring the stored records and their hashes in line with a drop's columns,
+        returning the columns the drop adds and the stored columns it lacks"""
+        if not len(self.data.columns):
+            self.identity_columns = list(drop.columns)
+            return [], []
+
+        added = [col for col in drop.columns if col not in self.data.columns]
+        missing = [col for col in self.data.columns if col not in drop.columns]
+
+        # New columns start empty, typed like the drop's values so they can be assigned
+        if added:
+            self.data = self.data.reindex(columns=self.data.columns.append(pd.Index(added)))
+            self.data = self.data.astype({col: drop[col].dtype for col in added})
+            # Copied, as changed records' hashes are later updated in place
+            self._content_hashes = _hash_rows(self.data).copy()
+
+        # A drop without some identity columns narrows the identity of every stored record
+        if not self.key_columns:
+            shared = [col for col in self.identity_columns if col in drop.columns]
+            if not shared:
+                raise ValueError("Data drop shares no columns with the stored records")
+            if shared != self.identity_columns:
+                self.identity_columns = shared
+                self._record_hashes = self._record_identity(self.data)
+                self._index = None
+
+        return added, missing
+
+    def ingest(self, drop):
+        """Merge a data drop: new records are appended, changed records replace the stored
+        version and exact duplicates are skipped. Returns the counts for this drop."""
+        drop = drop.reset_index(drop=True)
+        added, missing = self._align_schema(drop)
+        content = _hash_rows(drop)
+        identity = self._record_identity(drop)
+        counts = {'rows_read': len(drop), 'new_records': 0, 'duplicates': 0, 'updates': 0}
+
+        # A key repeated within the drop keeps its last row
+        last = ~pd.Series(identity).duplicated(keep='last').to_numpy()
+        if not last.all():
+            kept_content = pd.Series(content[last], index=identity[last])
+            same = content[~last] == kept_content.reindex(identity[~last]).to_numpy()
+            counts['duplicates'] += int(same.sum())
+            counts['updates'] += int((~same).sum())
+            drop, content, identity = drop[last].reset_index(drop=True), content[last], identity[last]
+
+        # One hash lookup per row against every stored record
+        positions = self._get_index().get_indexer(identity)
+        stored = positions >= 0
+        stored_content = self._content_hashes[positions[stored]]
+        if missing:
+            # Stored records are compared on the columns the drop has
+            stored_content = _hash_rows(self.data.iloc[positions[stored]][list(drop.columns)])
+        unchanged = np.zeros(len(drop), dtype=bool)
+        unchanged[stored] = stored_content == content[stored]
+        changed = stored & ~unchanged
+        new = ~stored
+
+        # Changed records take the drop's values; columns the drop lacks keep theirs
+        if changed.any():
+            rows = positions[changed]
+            for col in drop.columns:
+                self.data.iloc[rows, self.data.columns.get_loc(col)] = drop.loc[changed, col].to_numpy()
+            self._content_hashes[rows] = _hash_rows(self.data.iloc[rows]) if missing else content[changed]
+
+        # New records leave the columns the drop lacks empty
+        if new.any():
+            new_rows = drop[new]
+            if len(self.data.columns):
+                new_rows = new_rows.reindex(columns=self.data.columns).astype(
+                    {col: self.data[col].dtype for col in missing}
+                )
+            if len(self.data):
+                self.data = pd.concat([self.data, new_rows], ignore_index=True)
+            else:
+                self.data = new_rows.reset_index(drop=True)
+            self._record_hashes = np.concatenate([self._record_hashes, identity[new]])
+            self._content_hashes = np.concatenate([
+                self._content_hashes, _hash_rows(new_rows) if missing else content[new]
+            ])
+            self._index = None
+
+        counts['new_records'] = int(new.sum())
+        counts['duplicates'] += int(unchanged.sum())
+        counts['updates'] += int(changed.sum())
+
+        self.report['drops'] += 1
+        for key, value in counts.items():
+            self.report[key] += value
+
+        # Drops whose columns differ from the stored records are reported, not just merged
+        counts['columns_added'] = added
+        counts['columns_missing'] = missing
+        if added or missing:
+            self.report['schema_changes'] += 1
+            self.report['columns_added'] = sorted(set(self.report['columns_added']) | set(added))
+            self.report['columns_missing'] = sorted(set(self.report['columns_missing']) | set(missing))
+        return counts
+
+    def get_version(self):
+        """Identifier of the ingested drops, changing whenever a drop is added or modified"""
+        signature = repr((self.key_columns, sorted(self.drops.items())))
+        return hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+    def get_report(self):
+        """Cumulative ingest counts over every drop"""
+        report = dict(self.report)
+        report['columns_added'] = list(report['columns_added'])
+        report['columns_missing'] = list(report['columns_missing'])
+        report['records'] = len(self.data)
+        return report
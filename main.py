@@ -1,8 +1,23 @@
+import time
+SCRIPT_START = time.perf_counter()
 import streamlit as st
 import pandas as pd
-from charts import TBChartGenerator
+from charts import (TBChartGenerator, PRESET_WINDOWS, ABERRATION_SERIES, AGE_BAND_SCHEMES, ROLLING_WINDOWS,
+                    TARGETS, PERIOD_MONTHS, age_band_labels, figure_payload_size, target_status)
+from dataset import DATA_DIR, load_dataset
+from export import EXPORT_FORMATS, build_export
 from datetime import datetime, timedelta
-import time
+import os
+import re
+import threading
+
+@st.cache_resource
+def get_startup_timings():
+    """Cold-start timings of this server process, filled in by its first run"""
+    return {}
+
+startup_timings = get_startup_timings()
+startup_timings.setdefault("Import", time.perf_counter() - SCRIPT_START)
 
 # Page configuration
 st.set_page_config(
@@ -12,291 +27,163 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Replace your existing CSS section in main.py with this:
-
-st.markdown("""
-<style>
-    /* Dark mode optimization */
-    .stApp {
-        background-color: #0e1117;
-        color: #fafafa;
-    }
-    
-    /* Metric cards - dark theme */
-    .metric-card {
-        background: linear-gradient(145deg, #1e2329, #262d37);
-        padding: 25px;
-        border-radius: 15px;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.3);
-        border: 1px solid #333741;
-        margin: 15px 0;
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 12px 40px rgba(0,0,0,0.4);
-    }
-    
-    .big-number {
-        font-size: 3rem;
-        font-weight: 800;
-        background: linear-gradient(135deg, #00d4ff, #1f77b4);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-        margin: 10px 0;
-    }
-    
-    /* Target indicators - enhanced for dark mode */
-    .target-indicator {
-        padding: 8px 16px;
-        border-radius: 20px;
-        font-weight: 600;
-        font-size: 0.9rem;
-        margin-left: 10px;
-        display: inline-block;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.2);
-    }
-    
-    .target-good {
-        background: linear-gradient(135deg, #00c851, #007e33);
-        color: #ffffff;
-        border: 1px solid #00c851;
-    }
-    
-    .target-warning {
-        background: linear-gradient(135deg, #ffbb33, #ff8800);
-        color: #ffffff;
-        border: 1px solid #ffbb33;
-    }
-    
-    .target-danger {
-        background: linear-gradient(135deg, #ff4444, #cc0000);
-        color: #ffffff;
-        border: 1px solid #ff4444;
-    }
-    
-    /* Sidebar styling */
-    .css-1d391kg {
-        background-color: #1e2329;
-        border-right: 2px solid #333741;
-    }
-    
-    .sidebar .sidebar-content {
-        background-color: #1e2329;
-        color: #fafafa;
-    }
-    
-    /* Headers and text */
-    h1, h2, h3, h4, h5, h6 {
-        color: #fafafa !important;
-        font-weight: 600;
-    }
-    
-    h1 {
-        background: linear-gradient(135deg, #00d4ff, #1f77b4);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-    }
-    
-    /* Tabs styling for dark mode */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 12px;
-        background-color: #1e2329;
-        padding: 8px;
-        border-radius: 12px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        background: linear-gradient(145deg, #262d37, #1e2329);
-        border-radius: 10px;
-        padding: 12px 24px;
-        color: #fafafa;
-        border: 1px solid #333741;
-        transition: all 0.3s ease;
-    }
-    
-    .stTabs [data-baseweb="tab"]:hover {
-        background: linear-gradient(145deg, #333741, #262d37);
-        transform: translateY(-2px);
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(135deg, #00d4ff, #1f77b4) !important;
-        color: white !important;
-        box-shadow: 0 4px 20px rgba(0, 212, 255, 0.3);
-        border: 1px solid #00d4ff;
-    }
-    
-    /* Info boxes and expandable sections */
-    .streamlit-expanderHeader {
-        background-color: #262d37 !important;
-        border: 1px solid #333741;
-        border-radius: 8px;
-        color: #fafafa !important;
-    }
-    
-    .streamlit-expanderContent {
-        background-color: #1e2329 !important;
-        border: 1px solid #333741;
-        color: #fafafa !important;
-    }
-    
-    /* Metrics styling */
-    .css-1xarl3l {
-        background-color: #262d37;
-        border: 1px solid #333741;
-        border-radius: 10px;
-        padding: 15px;
-    }
-    
-    /* Input widgets */
-    .stSelectbox > div > div {
-        background-color: #262d37;
-        border: 1px solid #333741;
-        color: #fafafa;
-    }
-    
-    .stDateInput > div > div {
-        background-color: #262d37;
-        border: 1px solid #333741;
-        color: #fafafa;
-    }
-    
-    .stRadio > div {
-        background-color: #262d37;
-        border-radius: 8px;
-        padding: 10px;
-        border: 1px solid #333741;
-    }
-    
-    /* Charts container */
-    .js-plotly-plot {
-        background-color: #1e2329 !important;
-        border-radius: 10px;
-        border: 1px solid #333741;
-    }
-    
-    /* Success/info/warning boxes */
-    .stSuccess {
-        background-color: #0d4a2d;
-        border: 1px solid #00c851;
-        color: #fafafa;
-    }
-    
-    .stInfo {
-        background-color: #1a237e;
-        border: 1px solid #1f77b4;
-        color: #fafafa;
-    }
-    
-    .stWarning {
-        background-color: #4a2c0a;
-        border: 1px solid #ffbb33;
-        color: #fafafa;
-    }
-    
-    .stError {
-        background-color: #4a0d0d;
-        border: 1px solid #ff4444;
-        color: #fafafa;
-    }
-    
-    /* Footer */
-    .footer {
-        background-color: #1e2329;
-        color: #8b949e;
-        text-align: center;
-        padding: 20px;
-        border-top: 1px solid #333741;
-        margin-top: 40px;
-    }
-    
-    /* Scrollbars */
-    ::-webkit-scrollbar {
-        width: 8px;
-        height: 8px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: #1e2329;
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: #333741;
-        border-radius: 4px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: #4a5568;
-    }
-    
-    /* Plotly chart dark mode optimization */
-    .modebar {
-        background-color: #262d37 !important;
-    }
-    
-    /* Animation for metric cards */
-    @keyframes glow {
-        0% { box-shadow: 0 8px 32px rgba(0,0,0,0.3); }
-        50% { box-shadow: 0 8px 32px rgba(0, 212, 255, 0.1); }
-        100% { box-shadow: 0 8px 32px rgba(0,0,0,0.3); }
-    }
-    
-    .metric-card:hover {
-        animation: glow 2s infinite;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-
-
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes for auto-refresh
+# Spinners are drawn by the page, since the warm-up thread has no page to draw them on
+@st.cache_resource(ttl=300, show_spinner=False)  # Cache for 5 minutes for auto-refresh
 def load_data():
-    """Load TB surveillance data"""
+    """Load and deduplicate the TB surveillance data drops"""
     try:
-        df = pd.read_csv("data/Tuberculosis 2023-2024.csv", encoding="latin1")
-        return df
+        start = time.perf_counter()
+        records = load_dataset()
+        startup_timings.setdefault("Data load", time.perf_counter() - start)
+        return records
     except FileNotFoundError:
-        st.error("Data file not found. Please ensure 'data/Tuberculosis 2023-2024.csv' exists.")
+        st.error(f"No data files found. Please add the surveillance CSV exports to '{DATA_DIR}/'.")
         return None
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         return None
 
+@st.cache_resource(ttl=300, show_spinner=False)
+def load_chart_generator():
+    """Build the chart generator once per data load so validation runs once, and start warming
+    the preset windows for the new data version"""
+    records = load_data()
+    if records is None:
+        return None
+    start = time.perf_counter()
+    chart_gen = TBChartGenerator(records.data, engine=os.environ.get("TB_QUERY_ENGINE", "pandas"),
+                                 data_version=records.get_version())
+    startup_timings.setdefault("Preprocess", time.perf_counter() - start)
+    chart_gen.start_precompute(PRESET_WINDOWS)
+    return chart_gen
+
+@st.cache_resource
+def start_warm_up():
+    """Start loading the data and building the chart generator once per server process, so the
+    first page only waits for whatever is left of it"""
+    thread = threading.Thread(target=load_chart_generator, name="tb-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def load_css():
+    """Dashboard stylesheet, read once per process with comments and whitespace stripped"""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css")) as f:
+        css = re.sub(r"/\*.*?\*/", "", f.read(), flags=re.S)
+    return re.sub(r"\s+", " ", css).strip()
+
+start_warm_up()
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
+def show_ingest_report(report):
+    """Render the duplicate and updated record counts across data drops"""
+    st.markdown(f"""
+    - **Data drops:** {report['drops']:,}
+    - **Rows read:** {report['rows_read']:,}
+    - **Duplicate rows skipped:** {report['duplicates']:,}
+    - **Updated records:** {report['updates']:,}
+    - **Unique records:** {report['records']:,}
+    """)
+    
+    if report['schema_changes']:
+        changes = []
+        if report['columns_added']:
+            changes.append("added " + ", ".join(report['columns_added']))
+        if report['columns_missing']:
+            changes.append("missing " + ", ".join(report['columns_missing']))
+        st.warning(f"{report['schema_changes']:,} data drop(s) had different columns than the records "
+                   f"loaded before them ({'; '.join(changes)})")
+
+def show_quality_report(report):
+    """Render the data-quality counts recorded at load"""
+    st.markdown(f"""
+    - **Rows loaded:** {report['rows_loaded']:,}
+    - **Missing dates dropped:** {report['missing_dates_dropped']:,}
+    - **Unparseable dates dropped:** {report['unparseable_dates_dropped']:,}
+    - **Non-numeric ages:** {report['non_numeric_age']:,}
+    - **TPT completed exceeding eligible:** {report['tpt_exceeds_eligible']:,}
+    """)
+    
+    non_numeric = {col: n for col, n in report['non_numeric_contact_counts'].items() if n}
+    if non_numeric:
+        st.markdown("**Non-numeric contact counts (treated as 0):**")
+        for col, n in non_numeric.items():
+            st.markdown(f"- {col}: {n:,}")
+    
+    if report['missing_ltbi_columns']:
+        st.warning("Missing LTBI columns (coverage shows 0%): " + ", ".join(report['missing_ltbi_columns']))
+    
+    if report['unknown_outcome_labels']:
+        st.markdown("**Unknown treatment outcome labels:**")
+        for label, n in report['unknown_outcome_labels'].items():
+            st.markdown(f"- {label}: {n:,}")
+
+def show_chart(fig, name, payload_sizes=None):
+    """Render a figure, recording its payload size when instrumentation is on"""
+    if payload_sizes is not None:
+        payload_sizes[name] = figure_payload_size(fig)
+    st.plotly_chart(fig, use_container_width=True)
+
+def show_flagged_periods(flagged, series_names):
+    """List periods flagged by aberration detection for the given series"""
+    flagged = flagged[flagged['Series'].isin(series_names)]
+    if len(flagged) == 0:
+        st.caption("🚨 No aberrations detected in the selected window")
+        return
+    
+    with st.expander(f"🚨 Flagged Periods ({len(flagged)})", expanded=True):
+        for row in flagged.itertuples():
+            st.markdown(
+                f"- **{ABERRATION_SERIES[row.Series]}** in {row.Period}: "
+                f"{row.Count:,.0f} cases vs {row.Expected:,.1f} expected "
+                f"(C2 {row.C2:.1f}, CUSUM {row.CUSUM:.1f})"
+            )
+
+def get_interval_html(intervals, key, suffix=""):
+    """Get bootstrap confidence interval markup for a KPI card"""
+    if intervals is None:
+        return ""
+    interval = intervals[key]
+    return f'<p class="kpi-ci">95% CI: {interval["low"]:,}{suffix} – {interval["high"]:,}{suffix}</p>'
+
+def get_delta_html(delta, label, target_type="higher_better", suffix=""):
+    """Get trend arrow markup for a KPI card"""
+    if delta is None:
+        return f'<p class="kpi-delta delta-neutral">No data {label}</p>'
+    if delta == 0:
+        return f'<p class="kpi-delta delta-neutral">■ No change {label}</p>'
+    
+    improved = delta > 0 if target_type == "higher_better" else delta < 0
+    arrow = "▲" if delta > 0 else "▼"
+    delta_class = "delta-good" if improved else "delta-bad"
+    return f'<p class="kpi-delta {delta_class}">{arrow} {delta:+,g}{suffix} {label}</p>'
+
 def get_target_indicator(value, target, target_type="higher_better"):
     """Get target achievement indicator"""
-    if target_type == "higher_better":
-        if value >= target:
-            return "target-good", "✅ Target Met"
-        elif value >= target * 0.8:
-            return "target-warning", "⚠️ Close to Target"
-        else:
-            return "target-danger", "❌ Below Target"
-    else:  # lower_better
-        if value <= target:
-            return "target-good", "✅ Target Met"
-        elif value <= target * 1.2:
-            return "target-warning", "⚠️ Close to Target"
-        else:
-            return "target-danger", "❌ Above Target"
+    status = target_status([value], target, target_type)[0]
+    if status == 0:
+        return "target-good", "✅ Target Met"
+    elif status == 1:
+        return "target-warning", "⚠️ Close to Target"
+    elif target_type == "higher_better":
+        return "target-danger", "❌ Below Target"
+    else:
+        return "target-danger", "❌ Above Target"
 
 def main():
+    render_start = time.perf_counter()
+    
     # Header
     st.title("🏥 TB Surveillance Dashboard - Rwanda")
     st.markdown("**Monitoring Tuberculosis Cases and Treatment Outcomes**")
     
-    # Load data
-    df = load_data()
-    if df is None:
+    # Load data and initialize chart generator, waiting for the warm-up thread if it is still busy
+    with st.spinner("Loading surveillance data..."):
+        chart_gen = load_chart_generator()
+    if chart_gen is None:
         st.stop()
     
-    # Initialize chart generator
-    chart_gen = TBChartGenerator(df)
-    
     # Sidebar for filters
     with st.sidebar:
         st.header("📊 Dashboard Controls")
@@ -316,22 +203,50 @@ def main():
         
         # Get date range from data
         date_col = 'Enrollment date(Diagnostic Date)'
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        min_date = df[date_col].min().date()
-        max_date = df[date_col].max().date()
-        
-        # Date range selector
-        date_range = st.date_input(
-            "Select Date Range",
-            value=(min_date, max_date),
-            min_value=min_date,
-            max_value=max_date
+        min_date = chart_gen.df[date_col].min().date()
+        max_date = chart_gen.df[date_col].max().date()
+        
+        # Preset windows are precomputed in the background
+        preset_windows = chart_gen.get_preset_windows(PRESET_WINDOWS)
+        preset = st.selectbox(
+            "⚡ Quick Range",
+            ["Custom"] + list(preset_windows.keys()),
+            index=0
         )
         
+        if preset == "Custom":
+            # Date range selector
+            date_range = st.date_input(
+                "Select Date Range",
+                value=(min_date, max_date),
+                min_value=min_date,
+                max_value=max_date
+            )
+        else:
+            preset_start, preset_end = preset_windows[preset]
+            date_range = (preset_start.date(), preset_end.date())
+            st.caption(f"{date_range[0]} to {date_range[1]}")
+        
         # Period type
         period_type = st.radio(
             "📈 Analysis Period",
-            ["monthly", "quarterly"],
+            ["monthly", "quarterly", "weekly", "daily"],
+            index=0
+        )
+        
+        # Age band scheme
+        age_scheme = st.selectbox(
+            "👥 Age Bands",
+            list(AGE_BAND_SCHEMES.keys()),
+            format_func=lambda scheme: f"{scheme.upper() if scheme == 'who' else scheme.title()} "
+                                       f"({', '.join(age_band_labels(AGE_BAND_SCHEMES[scheme])[:-1])})",
+            index=0
+        )
+        
+        # Comparison window for KPI trends
+        comparison_type = st.selectbox(
+            "📊 Compare With",
+            ["Previous period", "Same period last year"],
             index=0
         )
         
@@ -351,6 +266,31 @@ def main():
         **TB Incidence Target:** 46/100,000 population
         """)
         
+        # Figure payload instrumentation
+        show_payloads = st.checkbox("📦 Show figure payload sizes", value=False)
+        
+        # Independent figures and KPIs can be built concurrently
+        parallel_build = st.checkbox("⚡ Build charts in parallel", value=True)
+        
+        # Data quality
+        st.markdown("---")
+        records = load_data()
+        
+        # Whole-row matching cannot tell an updated record from a new one
+        if records is not None and not records.key_columns and records.get_report()['drops'] > 1:
+            st.warning("No record key is set (TB_RECORD_KEY), so a record whose values changed between "
+                       "data drops is counted once per version. Set TB_RECORD_KEY to the patient ID column "
+                       "to replace updated records instead.")
+        with st.expander("🧪 Data Quality"):
+            if records is not None:
+                show_ingest_report(records.get_report())
+            show_quality_report(chart_gen.get_quality_report())
+        
+        # Background precompute status
+        progress = chart_gen.get_precompute_progress()
+        if progress['done'] < progress['total']:
+            st.caption(f"⚡ Precomputing presets: {progress['done']}/{progress['total']}")
+        
         # Last updated
         st.markdown("---")
         st.caption(f"Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -363,10 +303,44 @@ def main():
             pd.Timestamp(date_range[1])
         )
     
-    # Get big numbers
-    big_numbers = chart_gen.get_big_numbers(period_filter)
+    payload_sizes = {} if show_payloads else None
+    comparison_key = 'previous_period' if comparison_type == "Previous period" else 'last_year'
+    comparison_label = "vs previous period" if comparison_key == 'previous_period' else "vs same period last year"
     use_completed = outcome_type == "Cured + Completed"
     
+    # Every figure and KPI of the window only reads the shared data, so they are built in one batch
+    window_results, build_timings = chart_gen.run_concurrently({
+        'flagged_periods': lambda: chart_gen.get_flagged_periods(period_filter, period_type),
+        'kpi_comparison': lambda: chart_gen.get_big_numbers_comparison(period_filter, comparisons=(comparison_key,)),
+        'kpi_intervals': lambda: chart_gen.get_kpi_intervals(period_filter, use_completed),
+        'pie_fig': lambda: chart_gen.create_treatment_outcome_pie(period_filter, use_completed),
+        'time_fig': lambda: chart_gen.create_treatment_time_series(period_filter, period_type, use_completed),
+        'hr_pie_fig': lambda: chart_gen.create_high_risk_pie(period_filter),
+        'hr_time_fig': lambda: chart_gen.create_high_risk_time_series(period_filter, period_type),
+        'notification_fig': lambda: chart_gen.create_notification_time_series(period_filter, period_type),
+        'rolling_fig': lambda: chart_gen.create_rolling_trend_chart(period_filter, ROLLING_WINDOWS, use_completed),
+        'rolling_series': lambda: chart_gen.get_rolling_series(period_filter, ROLLING_WINDOWS, use_completed),
+        'notification_counts': lambda: chart_gen.get_notification_counts(period_filter),
+        'under14_fig': lambda: chart_gen.create_under14_pie(period_filter),
+        'age_fig': lambda: chart_gen.create_age_distribution_chart(period_filter, period_type, age_scheme),
+        'age_kpis': lambda: chart_gen.get_age_band_kpis(period_filter, age_scheme),
+        'target_figs': lambda: {period: chart_gen.create_target_heatmap(period_filter, period)
+                                for period in PERIOD_MONTHS},
+        'target_matrices': lambda: {period: chart_gen.get_target_matrix(period_filter, period)
+                                    for period in PERIOD_MONTHS}
+    }, period_filter, tuple(dict.fromkeys((period_type,) + tuple(PERIOD_MONTHS))), parallel=parallel_build)
+    
+    # Aberration flags inside the selected window
+    flagged_periods = window_results['flagged_periods']
+    
+    # Get big numbers with their comparison windows
+    kpi_comparison = window_results['kpi_comparison']
+    big_numbers = kpi_comparison['current']
+    kpi_delta = kpi_comparison[comparison_key]['delta']
+    
+    # Bootstrap uncertainty for the selected window
+    kpi_intervals = window_results['kpi_intervals']
+    
     # Key Metrics Row
     st.header("📈 Key Performance Indicators")
     
@@ -377,18 +351,21 @@ def main():
         <div class="metric-card">
             <h3>🎯 Total Cured Cases</h3>
             <div class="big-number">{big_numbers['total_cured']:,}</div>
+            {get_delta_html(kpi_delta['total_cured'], comparison_label)}
             <p>{"Cured + Completed" if use_completed else "Cured Only"} cases in selected period</p>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
         ltbi_value = big_numbers['ltbi_coverage']
-        ltbi_class, ltbi_text = get_target_indicator(ltbi_value, 90, "higher_better")
+        ltbi_class, ltbi_text = get_target_indicator(ltbi_value, *TARGETS['ltbi_coverage'])
         
         st.markdown(f"""
         <div class="metric-card">
             <h3>💉 LTBI Coverage</h3>
             <div class="big-number">{ltbi_value}%</div>
+            {get_delta_html(kpi_delta['ltbi_coverage'], comparison_label, suffix=" pts")}
+            {get_interval_html(kpi_intervals, 'ltbi_coverage', "%")}
             <span class="target-indicator {ltbi_class}">{ltbi_text}</span>
             <p>Target: >90%</p>
         </div>
@@ -396,12 +373,14 @@ def main():
     
     with col3:
         incidence_value = big_numbers['yearly_incidence']
-        incidence_class, incidence_text = get_target_indicator(incidence_value, 46, "lower_better")
+        incidence_class, incidence_text = get_target_indicator(incidence_value, *TARGETS['yearly_incidence'])
         
         st.markdown(f"""
         <div class="metric-card">
             <h3>📊 Yearly TB Incidence</h3>
             <div class="big-number">{incidence_value}</div>
+            {get_delta_html(kpi_delta['yearly_incidence'], comparison_label, "lower_better")}
+            {get_interval_html(kpi_intervals, 'yearly_incidence')}
             <span class="target-indicator {incidence_class}">{incidence_text}</span>
             <p>per 100,000 population (Target: ≤46)</p>
         </div>
@@ -410,11 +389,12 @@ def main():
     st.markdown("---")
     
     # Tabs for different analyses
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "🎯 Treatment Outcomes", 
         "⚠️ High-Risk Groups", 
         "📋 TB Notifications", 
-        "👶 Pediatric Analysis"
+        "👶 Pediatric Analysis",
+        "🗓️ Target Attainment"
     ])
     
     with tab1:
@@ -425,13 +405,13 @@ def main():
         
         with col1:
             st.subheader("Latest Month Distribution")
-            pie_fig = chart_gen.create_treatment_outcome_pie(period_filter, use_completed)
-            st.plotly_chart(pie_fig, use_container_width=True)
+            pie_fig = window_results['pie_fig']
+            show_chart(pie_fig, "Treatment outcome pie", payload_sizes)
         
         with col2:
             st.subheader("Trends Over Time")
-            time_fig = chart_gen.create_treatment_time_series(period_filter, period_type, use_completed)
-            st.plotly_chart(time_fig, use_container_width=True)
+            time_fig = window_results['time_fig']
+            show_chart(time_fig, "Treatment time series", payload_sizes)
         
         # Additional insights
         with st.expander("📝 Treatment Outcome Insights"):
@@ -439,6 +419,7 @@ def main():
             - **Analysis Period:** {period_type.title()} from {date_range[0]} to {date_range[1]}
             - **Success Definition:** {outcome_type}
             - **Total Cases:** {big_numbers['total_cured']:,} successful treatments
+            - **{"Treatment Success" if use_completed else "Cure"} Rate:** {kpi_intervals['cure_rate']['estimate'] if kpi_intervals else 0}% (95% CI: {kpi_intervals['cure_rate']['low'] if kpi_intervals else 0}% – {kpi_intervals['cure_rate']['high'] if kpi_intervals else 0}%)
             - **Data Source:** Treatment completion dates and diagnostic dates
             """)
     
@@ -450,13 +431,15 @@ def main():
         
         with col1:
             st.subheader("Latest Month Distribution")
-            hr_pie_fig = chart_gen.create_high_risk_pie(period_filter)
-            st.plotly_chart(hr_pie_fig, use_container_width=True)
+            hr_pie_fig = window_results['hr_pie_fig']
+            show_chart(hr_pie_fig, "High-risk pie", payload_sizes)
         
         with col2:
             st.subheader("Monthly Trends")
-            hr_time_fig = chart_gen.create_high_risk_time_series(period_filter, period_type)
-            st.plotly_chart(hr_time_fig, use_container_width=True)
+            hr_time_fig = window_results['hr_time_fig']
+            show_chart(hr_time_fig, "High-risk time series", payload_sizes)
+        
+        show_flagged_periods(flagged_periods, ['High_Risk'])
         
         with st.expander("📝 High-Risk Group Definitions"):
             st.markdown("""
@@ -473,23 +456,38 @@ def main():
         st.header("📋 TB Notifications: New and Relapse Cases")
         st.markdown("Analysis of new TB cases and relapse incidents with incidence rates per 100,000 population")
         
-        notification_fig = chart_gen.create_notification_time_series(period_filter, period_type)
-        st.plotly_chart(notification_fig, use_container_width=True)
+        notification_fig = window_results['notification_fig']
+        show_chart(notification_fig, "Notification time series", payload_sizes)
+        show_flagged_periods(flagged_periods, ['New', 'Relapse'])
+        
+        # Rolling trends smooth out month-to-month noise in the notification rates
+        rolling_fig = window_results['rolling_fig']
+        show_chart(rolling_fig, "Rolling trends", payload_sizes)
+        rolling_series = window_results['rolling_series']
+        latest_rolling = rolling_series[f'Incidence_{max(ROLLING_WINDOWS)}m'].dropna()
+        
+        notification_counts = window_results['notification_counts']
+        delta_label = "vs previous month"
+        if notification_counts and notification_counts['partial']:
+            previous_start, previous_end = notification_counts['previous_window']
+            delta_label = f"vs {previous_start.day}–{previous_end.day} {previous_end:%b}"
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.metric(
                 "🆕 New Cases (Latest Month)", 
-                value=f"{chart_gen.df[chart_gen.df['New_Case']==True].groupby('YearMonth').size().iloc[-1] if len(chart_gen.df[chart_gen.df['New_Case']==True]) > 0 else 0}",
-                delta=None
+                value=notification_counts['new'] if notification_counts else 0,
+                delta=f"{notification_counts['new_delta']:+,} {delta_label}" if notification_counts else None,
+                delta_color="inverse"
             )
         
         with col2:
             st.metric(
                 "🔄 Relapse Cases (Latest Month)", 
-                value=f"{chart_gen.df[chart_gen.df['Relapse_Case']==True].groupby('YearMonth').size().iloc[-1] if len(chart_gen.df[chart_gen.df['Relapse_Case']==True]) > 0 else 0}",
-                delta=None
+                value=notification_counts['relapse'] if notification_counts else 0,
+                delta=f"{notification_counts['relapse_delta']:+,} {delta_label}" if notification_counts else None,
+                delta_color="inverse"
             )
         
         with st.expander("📝 Notification Analysis Details"):
@@ -498,6 +496,7 @@ def main():
             - **Incidence Calculation:** (Cases / Population) × 100,000
             - **Target Incidence:** ≤46 per 100,000 population
             - **Current Yearly Incidence:** {big_numbers['yearly_incidence']:.1f} per 100,000
+            - **Latest {max(ROLLING_WINDOWS)}-Month Rolling Incidence:** {f"{latest_rolling.iloc[-1]:.1f} per 100,000" if len(latest_rolling) else "Not enough history"}
             - **Data includes:** New cases and relapse cases based on enrollment dates
             """)
     
@@ -512,7 +511,7 @@ def main():
             
             # LTBI Coverage metrics
             ltbi_coverage = big_numbers['ltbi_coverage']
-            target_class, target_text = get_target_indicator(ltbi_coverage, 90, "higher_better")
+            target_class, target_text = get_target_indicator(ltbi_coverage, *TARGETS['ltbi_coverage'])
             
             st.markdown(f"""
             <div class="metric-card">
@@ -548,8 +547,8 @@ def main():
         
         with col2:
             st.subheader("🧒 Under 14 TB Cases")
-            under14_fig = chart_gen.create_under14_pie(period_filter)
-            st.plotly_chart(under14_fig, use_container_width=True)
+            under14_fig = window_results['under14_fig']
+            show_chart(under14_fig, "Under 14 pie", payload_sizes)
         
         # Additional pediatric metrics
         st.subheader("📈 Pediatric TB Statistics")
@@ -577,6 +576,22 @@ def main():
         except Exception as e:
             st.warning("Could not calculate pediatric statistics")
         
+        # Age band breakdown
+        st.subheader("📊 Age Distribution")
+        
+        col1, col2 = st.columns([3, 2])
+        
+        with col1:
+            age_fig = window_results['age_fig']
+            show_chart(age_fig, "Age distribution", payload_sizes)
+        
+        with col2:
+            st.dataframe(
+                window_results['age_kpis'],
+                hide_index=True,
+                use_container_width=True
+            )
+        
         with st.expander("📝 Pediatric Analysis Notes"):
             st.markdown("""
             **LTBI Treatment Coverage:**
@@ -590,6 +605,84 @@ def main():
             - **Clinical note:** Children are more likely to develop severe forms of TB
             """)
     
+    with tab5:
+        st.header("🗓️ Target Attainment by Period")
+        st.markdown("LTBI coverage (overall and per high-risk group) and yearly incidence against their targets for every period in the selected range")
+        
+        # Target attainment is evaluated per month or quarter whatever the chart period
+        target_period = st.radio(
+            "Periods",
+            list(PERIOD_MONTHS.keys()),
+            format_func=lambda period: "Months" if period == "monthly" else "Quarters",
+            horizontal=True
+        )
+        
+        target_fig = window_results['target_figs'][target_period]
+        show_chart(target_fig, "Target attainment", payload_sizes)
+        
+        target_matrix = window_results['target_matrices'][target_period]
+        overall = target_matrix[target_matrix['Group'] == 'All cases']
+        missed = overall[overall['Status'] == 2]
+        period_name = "months" if target_period == "monthly" else "quarters"
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.metric(
+                f"💉 LTBI coverage: {period_name} missed",
+                value=f"{(missed['Metric'] == 'LTBI coverage').sum()} of {(overall['Metric'] == 'LTBI coverage').sum()}"
+            )
+        
+        with col2:
+            st.metric(
+                f"📊 Yearly incidence: {period_name} missed",
+                value=f"{(missed['Metric'] == 'Yearly incidence').sum()} of {(overall['Metric'] == 'Yearly incidence').sum()}"
+            )
+        
+        with st.expander("📝 Target Attainment Details"):
+            st.markdown(f"""
+            - **Green:** target met; **amber:** within 20% of the target; **red:** target missed; **grey:** no eligible contacts
+            - **LTBI Coverage Target:** ≥{TARGETS['ltbi_coverage'][0]}% of eligible contacts under 5 completing TPT
+            - **Incidence Target:** ≤{TARGETS['yearly_incidence'][0]} per 100,000, annualized from each period's new and relapse cases
+            - **High-risk groups:** coverage among the contacts of index cases in each group
+            """)
+    
+    # Figure payload sizes
+    if payload_sizes:
+        with st.expander("📦 Figure Payload Sizes"):
+            for name, size in payload_sizes.items():
+                st.markdown(f"- **{name}:** {size / 1024:,.1f} KB")
+            st.markdown(f"**Total:** {sum(payload_sizes.values()) / 1024:,.1f} KB")
+    
+    # Data export
+    st.markdown("---")
+    st.header("📥 Export Data")
+    st.markdown("Download the filtered line list and the per-period aggregates behind the charts")
+    
+    export_format = st.radio("File format", list(EXPORT_FORMATS.keys()), horizontal=True)
+    file_suffix = f"{date_range[0]}_{date_range[-1]}.{export_format}"
+    
+    col1, col2 = st.columns(2)
+    
+    # Files are only built when a button is clicked; the download holds the whole file in memory
+    with col1:
+        st.download_button(
+            "📋 Filtered line list",
+            data=lambda: build_export(chart_gen.iter_line_list(period_filter), export_format),
+            file_name=f"tb_line_list_{file_suffix}",
+            mime=EXPORT_FORMATS[export_format],
+            on_click="ignore"
+        )
+    
+    with col2:
+        st.download_button(
+            f"📈 {period_type.title()} aggregates",
+            data=lambda: build_export([chart_gen.get_period_table(period_filter, period_type)], export_format),
+            file_name=f"tb_{period_type}_aggregates_{file_suffix}",
+            mime=EXPORT_FORMATS[export_format],
+            on_click="ignore"
+        )
+    
     # Footer
     st.markdown("---")
     st.markdown("""
@@ -600,6 +693,22 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
+    startup_timings.setdefault("First render", time.perf_counter() - render_start)
+    
+    with st.sidebar:
+        with st.expander("⏱️ Startup Timings"):
+            for step, seconds in startup_timings.items():
+                st.text(f"{step}: {seconds * 1000:.0f} ms")
+            st.caption(f"Total: {sum(startup_timings.values()) * 1000:.0f} ms")
+        
+        with st.expander("⚡ Chart Build Timings"):
+            slowest = max(build_timings['calls'], key=build_timings['calls'].get)
+            st.text(f"Wall time: {build_timings['wall'] * 1000:.0f} ms")
+            st.text(f"One after another{' (est.)' if parallel_build else ''}: {build_timings['sequential'] * 1000:.0f} ms")
+            st.text(f"Time saved: {build_timings['saved'] * 1000:.0f} ms")
+            st.caption(f"Slowest: {slowest} ({build_timings['calls'][slowest] * 1000:.0f} ms CPU)"
+                       f"{'' if parallel_build else ' · parallel building is off'}")
+    
     # Auto-refresh logic
     if auto_refresh:
         time.sleep(300)  # Wait 5 minutes
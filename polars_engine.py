@@ -0,0 +1,312 @@
+import pandas as pd
+import polars as pl
+from pandas.tseries.api import guess_datetime_format
+from charts import UNDER5_COLS, YES_NO_COLS, FLAG_COLUMNS, KNOWN_OUTCOMES, MAX_AGE, UNKNOWN_AGE
+
+DATE_COL = 'Enrollment date(Diagnostic Date)'
+
+# Polars truncation and pandas period frequency for each period column
+PERIOD_TRUNCATE = {
+    'YearMonth': ('1mo', 'M'),
+    'Quarter': ('1q', 'Q'),
+    'Week': ('1w', 'W'),
+    'Day': ('1d', 'D')
+}
+
+def _normalized(col):
+    """Stripped, lowercased text of a column"""
+    return pl.col(col).cast(pl.Utf8).str.strip_chars().str.to_lowercase()
+
+def _numeric(col, schema):
+    """A text or numeric column as floats, null where a value cannot be parsed"""
+    values = pl.col(col)
+    if schema[col] == pl.Utf8:
+        values = values.str.strip_chars()
+    return values.cast(pl.Float64, strict=False).fill_nan(None)
+
+def _date_format(dates):
+    """The single strptime format pandas infers from the first date, when Polars can parse it too"""
+    first = dates.dropna()
+    if len(first) == 0 or not isinstance(first.iloc[0], str):
+        return None
+    date_format = guess_datetime_format(first.iloc[0])
+    if date_format is None or '%f' in date_format or '%z' in date_format:
+        return None
+    return date_format
+
+def _period_ordinals(days):
+    """Pandas period ordinals for each period column, from days since the epoch"""
+    date = pl.from_epoch(days, time_unit='d')
+    return [
+        ((date.dt.year().cast(pl.Int64) - 1970) * 12 + date.dt.month() - 1).alias('YearMonth'),
+        ((date.dt.year().cast(pl.Int64) - 1970) * 4 + (date.dt.month() - 1) // 3).alias('Quarter'),
+        ((days + 3) // 7 + 1).alias('Week'),
+        days.alias('Day')
+    ]
+
+class PolarsEngine:
+    """Lazy, multithreaded Polars query plans matching the pandas paths in charts.py"""
+
+    def __init__(self, df):
+        # Only the columns the queries read; mixed object columns are read as text
+        columns = [DATE_COL, 'Treatment outcome', 'Previous treatment history', 'TB_Current age',
+                   'HIV status', 'Method of TB confirmation'] + YES_NO_COLS + UNDER5_COLS
+        data = {}
+        self.date_format = None
+        for col in columns:
+            if col not in df.columns:
+                continue
+            if col == DATE_COL and not pd.api.types.is_datetime64_any_dtype(df[col]):
+                # Dates pandas would parse element by element are parsed by pandas up front
+                self.date_format = _date_format(df[col])
+                if self.date_format is None:
+                    data[col] = pd.to_datetime(df[col], errors='coerce')
+                    continue
+            if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+                data[col] = df[col].astype('string')
+            else:
+                data[col] = df[col]
+
+        self.frame = pl.from_pandas(pd.DataFrame(data).reset_index(drop=True))
+
+    def prepare(self):
+        """Validate, coerce and derive every column in one plan. Returns the derived columns
+        as pandas, the data-quality counts and the positions of the rows kept."""
+        raw = self.frame
+        if raw.schema[DATE_COL] == pl.Utf8:
+            dates = pl.col(DATE_COL).str.strptime(pl.Datetime('us'), self.date_format, strict=False)
+        else:
+            dates = pl.col(DATE_COL).cast(pl.Datetime('us'))
+        under5 = [col for col in UNDER5_COLS if col in raw.columns]
+
+        # Rows without a usable enrollment date are dropped
+        lines = raw.lazy().with_row_index('_source').with_columns(
+            dates.alias('_date'),
+            pl.col(DATE_COL).is_not_null().alias('_has_date')
+        )
+        date_counts = lines.select(
+            (~pl.col('_has_date')).sum().alias('missing_dates_dropped'),
+            (pl.col('_date').is_null() & pl.col('_has_date')).sum().alias('unparseable_dates_dropped')
+        )
+        lines = lines.filter(pl.col('_date').is_not_null()).with_columns(
+            pl.col('_date').alias(DATE_COL)
+        ).drop('_date', '_has_date').with_row_index('_row')
+
+        # Age stays null when it cannot be parsed; contact counts count as zero
+        coerced = lines.with_columns(
+            [_numeric('TB_Current age', raw.schema).alias('_age')] +
+            [_numeric(col, raw.schema).alias(f'_{col}') for col in under5]
+        )
+        counts = [(pl.col('_age').is_null() & pl.col('TB_Current age').is_not_null()).sum().alias('non_numeric_age')]
+        counts += [(pl.col(f'_{col}').is_null() & pl.col(col).is_not_null()).sum().alias(col) for col in under5]
+        lines = coerced.with_columns(
+            [pl.col('_age').alias('TB_Current age')] +
+            [pl.col(f'_{col}').fill_null(0.0).alias(col) for col in under5]
+        ).drop(['_age'] + [f'_{col}' for col in under5])
+        if len(under5) == len(UNDER5_COLS):
+            contacts = [pl.col(f'_{col}').fill_null(0.0) for col in UNDER5_COLS]
+            eligible = (contacts[0] - contacts[1]).clip(lower_bound=0)
+            counts.append((contacts[2] > eligible).sum().alias('tpt_exceeds_eligible'))
+
+        # Outcome labels outside the known set (blank outcomes are not counted)
+        labels = pl.col('Treatment outcome').cast(pl.Utf8).str.strip_chars()
+        unknown = lines.select(labels.alias('label')).filter(
+            pl.col('label').is_not_null() & (pl.col('label') != '') &
+            ~pl.col('label').str.to_lowercase().is_in(KNOWN_OUTCOMES)
+        ).group_by('label').len()
+
+        available = [col for col in YES_NO_COLS if col in raw.columns]
+        if 'HIV status' in raw.columns:
+            hiv_positive = (_normalized('HIV status') == 'positive').fill_null(False)
+        else:
+            hiv_positive = pl.lit(False)
+        history = _normalized('Previous treatment history')
+        outcome = _normalized('Treatment outcome')
+        age = pl.col('TB_Current age')
+        days = pl.col(DATE_COL).dt.date().cast(pl.Int64)
+
+        lines = lines.with_columns(
+            [(_normalized(col) == 'yes').fill_null(False).alias(col) for col in available] + [
+                (outcome == 'cured').fill_null(False).cast(pl.Int64).alias('Is_Cured'),
+                outcome.is_in(['cured', 'completed']).fill_null(False).cast(pl.Int64).alias('Is_CuredCompleted'),
+                (age < 15).fill_null(False).alias('Under15'),
+                (age > 65).fill_null(False).alias('Above65'),
+                (age < 14).fill_null(False).alias('Under14'),
+                hiv_positive.alias('HIV_Positive'),
+                (history == 'new').fill_null(False).alias('New_Case'),
+                (history == 'relapse').fill_null(False).alias('Relapse_Case'),
+                pl.when((age >= 0) & (age <= MAX_AGE)).then(age.floor()).otherwise(UNKNOWN_AGE)
+                .cast(pl.UInt8).alias('Age_Code')
+            ] + _period_ordinals(days)
+        ).with_columns(
+            pl.any_horizontal(available + ['HIV_Positive', 'Under15', 'Above65']).alias('High_Risk'),
+            (pl.col('New_Case') | pl.col('Relapse_Case')).alias('New_or_Relapse')
+        )
+
+        # The line list and its counts come out of one multithreaded collect
+        self.frame, date_counts, counts, unknown = pl.collect_all([lines, date_counts, coerced.select(counts), unknown])
+        date_counts, counts = date_counts.row(0, named=True), counts.row(0, named=True)
+
+        report = {
+            'rows_loaded': raw.height,
+            'missing_dates_dropped': int(date_counts['missing_dates_dropped']),
+            'unparseable_dates_dropped': int(date_counts['unparseable_dates_dropped']),
+            'non_numeric_age': int(counts['non_numeric_age']),
+            'non_numeric_contact_counts': {col: int(counts[col]) for col in under5},
+            'missing_ltbi_columns': [col for col in UNDER5_COLS if col not in under5],
+            'tpt_exceeds_eligible': int(counts.get('tpt_exceeds_eligible', 0)),
+            'unknown_outcome_labels': {label: int(n) for label, n in unknown.iter_rows()}
+        }
+
+        columns = [DATE_COL, 'TB_Current age'] + under5 + available + FLAG_COLUMNS + ['Age_Code']
+        derived = self.frame.select(columns).to_pandas()
+        for col, (_, freq) in PERIOD_TRUNCATE.items():
+            derived[col] = pd.arrays.PeriodArray(self.frame[col].to_numpy(), dtype=pd.PeriodDtype(freq))
+        return derived, report, self.frame['_source'].to_numpy()
+
+    def _window(self, period_filter):
+        """Lazy line list restricted to a date window"""
+        lines = self.frame.lazy()
+        if period_filter is None:
+            return lines
+
+        start_date, end_date = period_filter
+        return lines.filter(
+            (pl.col(DATE_COL) >= pd.Timestamp(start_date).to_pydatetime()) &
+            (pl.col(DATE_COL) <= pd.Timestamp(end_date).to_pydatetime())
+        )
+
+    def period_table(self, period_filter, group_col):
+        """Per-period aggregates with the same columns as the pandas groupby"""
+        every, freq = PERIOD_TRUNCATE[group_col]
+
+        plan = self._window(period_filter).group_by(
+            pl.col(DATE_COL).dt.truncate(every).alias('Period')
+        ).agg(
+            pl.len().cast(pl.Int64).alias('Cases'),
+            pl.col('Method of TB confirmation').count().cast(pl.Int64).alias('Diagnosed'),
+            pl.col('Is_Cured').sum().cast(pl.Int64).alias('Cured'),
+            pl.col('Is_CuredCompleted').sum().cast(pl.Int64).alias('CuredCompleted'),
+            pl.col('High_Risk').sum().cast(pl.Int64).alias('High_Risk'),
+            pl.col('New_Case').sum().cast(pl.Int64).alias('New'),
+            pl.col('Relapse_Case').sum().cast(pl.Int64).alias('Relapse')
+        ).sort('Period')
+
+        table = plan.collect().to_pandas()
+        table['Period'] = pd.to_datetime(table['Period']).dt.to_period(freq)
+        return table
+
+    def per_date_totals(self, has_ltbi):
+        """KPI inputs summed per enrollment timestamp"""
+        totals = [
+            pl.len().cast(pl.Int64).alias('rows'),
+            pl.col('Is_Cured').sum().cast(pl.Int64).alias('cured'),
+            pl.col('New_or_Relapse').sum().cast(pl.Int64).alias('new_relapse'),
+            pl.col('New_Case').sum().cast(pl.Int64).alias('new'),
+            pl.col('Relapse_Case').sum().cast(pl.Int64).alias('relapse')
+        ]
+        if has_ltbi:
+            eligible = (pl.col(UNDER5_COLS[0]) - pl.col(UNDER5_COLS[1])).clip(lower_bound=0)
+            totals += [
+                eligible.sum().alias('eligible'),
+                pl.col(UNDER5_COLS[2]).sum().alias('tpt_completed')
+            ]
+
+        plan = self.frame.lazy().group_by(DATE_COL).agg(totals).sort(DATE_COL)
+        per_date = plan.collect().to_pandas().set_index(DATE_COL)
+        per_date.index = pd.to_datetime(per_date.index)
+        return per_date
+
+    def latest_month_counts(self, period_filter):
+        """Outcome and high-risk counts for the latest month of a window"""
+        month = pl.col(DATE_COL).dt.truncate('1mo')
+
+        plan = self._window(period_filter).filter(month == month.max()).select(
+            month.max().alias('month'),
+            pl.len().alias('rows'),
+            pl.col('Is_Cured').sum().alias('cured'),
+            pl.col('Is_CuredCompleted').sum().alias('cured_completed'),
+            pl.col('High_Risk').sum().alias('high_risk')
+        )
+
+        counts = plan.collect().row(0, named=True)
+        latest_month = pd.NaT if counts['month'] is None else pd.Timestamp(counts['month']).to_period('M')
+        return {
+            'month': latest_month,
+            'rows': int(counts['rows']),
+            'cured': int(counts['cured'] or 0),
+            'cured_completed': int(counts['cured_completed'] or 0),
+            'high_risk': int(counts['high_risk'] or 0)
+        }
+
+    def under14_counts(self, period_filter):
+        """Under-14 cases and their new/relapse subset within a window"""
+        plan = self._window(period_filter).select(
+            pl.col('Under14').sum().alias('rows'),
+            (pl.col('Under14') & pl.col('New_or_Relapse')).sum().alias('new_relapse')
+        )
+
+        counts = plan.collect().row(0, named=True)
+        return {'rows': int(counts['rows'] or 0), 'new_relapse': int(counts['new_relapse'] or 0)}
+
+    def window_positions(self, period_filter):
+        """Positions in the line list of the rows inside a date window"""
+        return self._window(period_filter).select('_row').collect()['_row'].to_numpy()
+
+    def bootstrap_rows(self, period_filter, use_completed, has_ltbi):
+        """Distinct bootstrap input rows of a window in first-seen order, their counts and the date span"""
+        zero = pl.lit(0.0)
+        values = [
+            (pl.col(UNDER5_COLS[0]) - pl.col(UNDER5_COLS[1])).clip(lower_bound=0) if has_ltbi else zero,
+            pl.col(UNDER5_COLS[2]) if has_ltbi else zero,
+            pl.col('Is_CuredCompleted' if use_completed else 'Is_Cured'),
+            pl.col('New_or_Relapse')
+        ]
+        names = ['eligible', 'completed', 'cured', 'new_relapse']
+        lines = self._window(period_filter).select(
+            [value.cast(pl.Float64).alias(name) for value, name in zip(values, names)] + [pl.col(DATE_COL)]
+        )
+
+        distinct, span = pl.collect_all([
+            lines.group_by(names, maintain_order=True).len(),
+            lines.select(pl.len().alias('rows'), pl.col(DATE_COL).min().alias('first'),
+                         pl.col(DATE_COL).max().alias('last'))
+        ])
+        span = span.row(0, named=True)
+        return {
+            'rows': int(span['rows']),
+            'distinct': distinct.select(names).to_numpy().astype(float),
+            'counts': distinct['len'].to_numpy(),
+            'first': pd.Timestamp(span['first']) if span['first'] is not None else None,
+            'last': pd.Timestamp(span['last']) if span['last'] is not None else None
+        }
+
+    def age_year_counts(self, period_filter, group_col):
+        """Cases, new/relapse and cured per period ordinal and age code"""
+        plan = self._window(period_filter).group_by(group_col, 'Age_Code').agg(
+            pl.len().cast(pl.Int64).alias('cases'),
+            pl.col('New_or_Relapse').sum().cast(pl.Int64).alias('new_relapse'),
+            pl.col('Is_Cured').sum().cast(pl.Int64).alias('cured')
+        )
+        table = plan.collect()
+        return {col: table[col].to_numpy() for col in table.columns}
+
+    def group_period_sums(self, period_filter, group_col, group_cols, has_ltbi):
+        """Cases, LTBI inputs and new/relapse per period ordinal for all cases (group 0) and each
+        high-risk group, one lazy aggregation per group run in a single collect"""
+        lines = self._window(period_filter)
+        zero = pl.lit(0.0)
+        sums = [
+            pl.len().cast(pl.Float64).alias('cases'),
+            ((pl.col(UNDER5_COLS[0]) - pl.col(UNDER5_COLS[1])).clip(lower_bound=0) if has_ltbi else zero)
+            .sum().cast(pl.Float64).alias('eligible'),
+            (pl.col(UNDER5_COLS[2]) if has_ltbi else zero).sum().cast(pl.Float64).alias('completed'),
+            pl.col('New_or_Relapse').sum().cast(pl.Float64).alias('new_relapse')
+        ]
+        plans = [
+            (lines if col is None else lines.filter(pl.col(col))).group_by(group_col).agg(sums)
+            .with_columns(pl.lit(group, dtype=pl.Int64).alias('group'))
+            for group, col in enumerate([None] + list(group_cols))
+        ]
+        table = pl.concat(plans).collect()
+        return {col: table[col].to_numpy() for col in table.columns}
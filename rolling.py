@@ -0,0 +1,61 @@
+import threading
+import numpy as np
+import pandas as pd
+
+class RollingSums:
+    """Trailing-window sums over per-period counts, kept as cumulative sums updated incrementally"""
+
+    def __init__(self):
+        self._periods = pd.PeriodIndex([], freq='M')
+        self._columns = []
+        self._counts = np.zeros((0, 0), dtype=np.int64)
+        self._cum = np.zeros((1, 0), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def _changed_from(self, periods, columns, counts):
+        """First position where the new series differs from the processed one"""
+        if len(self._periods) == 0 or self._periods.freq != periods.freq or self._columns != columns:
+            return 0
+
+        common = min(len(self._periods), len(periods))
+        same = (self._periods[:common] == periods[:common]) & (self._counts[:common] == counts[:common]).all(axis=1)
+        return common if same.all() else int(np.argmin(same))
+
+    def update(self, periods, counts, lengths):
+        """Bring the sums up to date with a full series, re-accumulating only new or changed periods,
+        and return the trailing sums for each window length"""
+        periods = pd.PeriodIndex(periods)
+        columns = list(counts.columns)
+        values = counts.to_numpy(dtype=np.int64)
+
+        with self._lock:
+            start = self._changed_from(periods, columns, values)
+
+            # Row i of the cumulative sums holds the total of the first i periods
+            kept = self._cum[:start + 1] if start > 0 else np.zeros((1, len(columns)), dtype=np.int64)
+            added = kept[-1] + np.cumsum(values[start:], axis=0)
+
+            self._periods = periods
+            self._columns = columns
+            self._counts = values
+            self._cum = np.vstack([kept, added])
+
+            return {length: self._window_sums(length) for length in lengths}
+
+    def _window_sums(self, length):
+        """Sums over the trailing length periods ending at each period, NaN until there is enough history"""
+        sums = np.full(self._counts.shape, np.nan)
+        if 0 < length <= len(self._periods):
+            sums[length - 1:] = self._cum[length:] - self._cum[:-length]
+        return pd.DataFrame(sums, index=self._periods, columns=self._columns)
+
+# Sums live for the whole process so each data refresh only accumulates new periods
+_ROLLING_SUMS = {}
+_ROLLING_SUMS_LOCK = threading.Lock()
+
+def get_rolling_sums(key):
+    """Get the shared rolling sums for a series key, creating them on first use"""
+    with _ROLLING_SUMS_LOCK:
+        if key not in _ROLLING_SUMS:
+            _ROLLING_SUMS[key] = RollingSums()
+        return _ROLLING_SUMS[key]
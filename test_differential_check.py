@@ -0,0 +1,6 @@
+from differential_check import run
+
+def test_differential_checks():
+    """Optimized paths agree with the reference computations on randomized line lists"""
+    checker = run(n_datasets=3, n_windows=3)
+    assert not checker.failures, "\n".join(checker.failures[:20])